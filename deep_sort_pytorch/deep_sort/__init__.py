@@ -8,7 +8,14 @@ def build_tracker(cfg, use_cuda):
     return DeepSort(cfg.DEEPSORT.REID_CKPT, 
                 max_dist=cfg.DEEPSORT.MAX_DIST, min_confidence=cfg.DEEPSORT.MIN_CONFIDENCE, 
                 nms_max_overlap=cfg.DEEPSORT.NMS_MAX_OVERLAP, max_iou_distance=cfg.DEEPSORT.MAX_IOU_DISTANCE, 
-                max_age=cfg.DEEPSORT.MAX_AGE, n_init=cfg.DEEPSORT.N_INIT, nn_budget=cfg.DEEPSORT.NN_BUDGET, use_cuda=use_cuda)
+                max_age=cfg.DEEPSORT.MAX_AGE, n_init=cfg.DEEPSORT.N_INIT, nn_budget=cfg.DEEPSORT.NN_BUDGET, use_cuda=use_cuda,
+                assignment_backend=cfg.DEEPSORT.ASSIGNMENT_BACKEND,
+                reid_refresh_interval=cfg.DEEPSORT.REID_REFRESH_INTERVAL,
+                lazy_reid=cfg.DEEPSORT.LAZY_REID,
+                int8_model_path=cfg.DEEPSORT.REID_INT8_CKPT,
+                reid_backend=cfg.DEEPSORT.REID_BACKEND,
+                reid_batch_buckets=cfg.DEEPSORT.REID_BATCH_BUCKETS,
+                reid_profile=cfg.DEEPSORT.REID_PROFILE)
     
 
 
@@ -0,0 +1,117 @@
+"""
+Benchmarks behind the tables in README.md. Run from this directory:
+    python benchmark.py assignment
+    python benchmark.py track-pool
+"""
+import argparse
+import sys
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from sort import linear_assignment
+from sort.detection import Detection
+from sort.nn_matching import NearestNeighborDistanceMetric
+from sort.state_store import StateStore
+from sort.track import Track
+from sort.tracker import Tracker
+
+
+def benchmark_assignment(sizes=(10, 50, 200), densities=(0.05, 0.3),
+                         num_matrices=20, max_distance=0.2, seed=0):
+    """
+    Mean time per solve of every assignment backend on synthetic square cost
+    matrices, in which a fraction `density` of the entries is feasible and
+    the rest share the infeasible cost. Inexact backends also report the
+    number of matches relative to the exact solution and the relative change
+    of the total cost of the matches.
+    """
+    rng = np.random.default_rng(seed)
+
+    def score(cost_matrix, row_indices, col_indices):
+        costs = cost_matrix[row_indices, col_indices]
+        costs = costs[costs <= max_distance]
+        return len(costs), costs.sum()
+
+    backends = linear_assignment.ASSIGNMENT_BACKENDS
+    print('| tracks x detections | feasible | ' + ' | '.join(backends) + ' |')
+    print('|---|---|' + '---|' * len(backends))
+    for size in sizes:
+        for density in densities:
+            cost_matrices = []
+            for _ in range(num_matrices):
+                costs = rng.random((size, size)) * max_distance
+                cost_matrices.append(np.where(
+                    rng.random((size, size)) < density, costs,
+                    max_distance + 1e-5))
+            exact = [score(c, *linear_assignment.hungarian_solver(c, max_distance))
+                     for c in cost_matrices]
+            cells = []
+            for solver in backends.values():
+                seconds = min(timeit.repeat(
+                    lambda: [solver(c, max_distance) for c in cost_matrices],
+                    number=3, repeat=3)) / num_matrices / 3
+                scores = [score(c, *solver(c, max_distance)) for c in cost_matrices]
+                matches = np.mean([s[0] - e[0] for s, e in zip(scores, exact)])
+                gap = 100. * sum(s[1] - e[1] for s, e in zip(scores, exact)) / \
+                    sum(e[1] for e in exact)
+                cell = '%.3f ms' % (1000. * seconds)
+                if '%+.1f' % matches not in ('+0.0', '-0.0') or '%+.1f' % gap not in ('+0.0', '-0.0'):
+                    cell += ' (%+.1f / %+.1f%%)' % (matches, gap)
+                cells.append(cell)
+            print('| %d x %d | %d%% | %s |' % (size, size, 100 * density, ' | '.join(cells)))
+
+
+def benchmark_track_pool(num_targets=30, num_clutter=20, warmup=50,
+                         num_frames=150, seed=0):
+    """
+    Track churn: `num_targets` persistent targets plus `num_clutter` random
+    short-lived detections per frame, each of which starts a track that is
+    deleted again. Reports the size of a track object, the track objects
+    created and recycled by the pool, and the memory allocated in track.py
+    and tracker.py after `warmup` frames.
+    """
+    rng = np.random.default_rng(seed)
+    track = Track(np.zeros(8), np.eye(8), 1, 3, 70, store=StateStore())
+    size = sys.getsizeof(track)
+    if hasattr(track, '__dict__'):
+        size += sys.getsizeof(track.__dict__)
+    print('Track object: %d bytes' % size)
+
+    tracker = Tracker(NearestNeighborDistanceMetric("cosine", 0.2, 100), max_age=5)
+    identity = np.eye(64, dtype=np.float32)
+
+    def step(frame_idx):
+        detections = [Detection([50 + 30 * i + frame_idx, 100, 20, 40], 0.9, identity[i])
+                      for i in range(num_targets)]
+        detections += [Detection(np.r_[rng.random(2) * 1000 + 1200, 20, 40], 0.9,
+                                 rng.random(64).astype(np.float32))
+                       for _ in range(num_clutter)]
+        tracker.predict()
+        tracker.update(detections)
+
+    for frame_idx in range(warmup):
+        step(frame_idx)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for frame_idx in range(warmup, num_frames):
+        step(frame_idx)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    print('%d frames: %d track objects created, %d reused' % (
+        num_frames, tracker.pool.num_created, tracker.pool.num_reused))
+    for stat in after.compare_to(before, 'filename'):
+        if stat.traceback[0].filename.endswith(('track.py', 'tracker.py')):
+            print('after warm-up: %s' % stat)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Deep SORT benchmarks")
+    parser.add_argument("benchmark", choices=["assignment", "track-pool"])
+    args = parser.parse_args()
+    if args.benchmark == "assignment":
+        benchmark_assignment()
+    else:
+        benchmark_track_pool()
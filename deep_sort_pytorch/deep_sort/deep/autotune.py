@@ -0,0 +1,107 @@
+import json
+import os
+import time
+
+import numpy as np
+import torch
+
+DEFAULT_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+
+def _thread_counts():
+    """Powers of two up to the number of cores, and the number of cores."""
+    cpu_count = os.cpu_count() or 1
+    counts = {cpu_count}
+    n = 1
+    while n < cpu_count:
+        counts.add(n)
+        n *= 2
+    return sorted(counts)
+
+
+def _latency_ms(forward, im_batch, repeats):
+    forward(im_batch)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        forward(im_batch)
+        times.append(time.perf_counter() - start)
+    return 1000. * float(np.median(times))
+
+
+def autotune(extractor, buckets=DEFAULT_BUCKETS, thread_counts=None,
+             repeats=5, min_efficiency=0.95):
+    """
+    Measure the ReID forward latency of `extractor` for each batch size in
+    `buckets` and, on the CPU, each `torch.set_num_threads` value in
+    `thread_counts` (defaults to powers of two up to the number of cores).
+
+    The profile keeps the thread count with the highest throughput, and the
+    buckets up to the smallest one that reaches `min_efficiency` of that
+    throughput; larger batches only add memory and padding.
+
+    Returns the profile as a dict with keys device, backend, cpu_count,
+    num_threads, buckets and latency_ms (per kept bucket).
+    """
+    if extractor.device != "cpu" or extractor.backend == "onnx":
+        # torch threads do not affect CUDA kernels or ONNX Runtime sessions.
+        thread_counts = [torch.get_num_threads()]
+    elif thread_counts is None:
+        thread_counts = _thread_counts()
+    buckets = sorted(buckets)
+    width, height = extractor.size
+
+    best = None
+    for num_threads in thread_counts:
+        torch.set_num_threads(num_threads)
+        latency = {}
+        for bucket in buckets:
+            im_batch = torch.randn(bucket, 3, height, width).to(extractor.device)
+            latency[bucket] = _latency_ms(extractor._forward, im_batch, repeats)
+        throughput = max(b / latency[b] for b in buckets)
+        if best is None or throughput > best[0]:
+            best = (throughput, num_threads, latency)
+
+    throughput, num_threads, latency = best
+    max_bucket = next(b for b in buckets
+                      if b / latency[b] >= min_efficiency * throughput)
+    kept = [b for b in buckets if b <= max_bucket]
+    torch.set_num_threads(num_threads)
+    return {
+        "device": extractor.device,
+        "backend": extractor.backend,
+        "cpu_count": os.cpu_count(),
+        "num_threads": num_threads,
+        "buckets": kept,
+        "latency_ms": {str(b): round(latency[b], 3) for b in kept},
+    }
+
+
+def load_profile(path, extractor):
+    """
+    Load a profile saved by `save_profile`. Returns None if there is none,
+    or if it was measured for another device, backend or host size.
+    """
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        profile = json.load(f)
+    if (profile.get("device"), profile.get("backend"), profile.get("cpu_count")) != \
+            (extractor.device, extractor.backend, os.cpu_count()):
+        return None
+    return profile
+
+
+def save_profile(profile, path):
+    with open(path, "w") as f:
+        json.dump(profile, f, indent=2)
+
+
+def format_profile(profile):
+    lines = ["ReID batch profile: {} threads, buckets {}".format(
+        profile["num_threads"], profile["buckets"])]
+    for bucket in profile["buckets"]:
+        ms = profile["latency_ms"][str(bucket)]
+        lines.append("  batch {:3d}: {:8.2f} ms ({:.2f} ms per crop)".format(
+            bucket, ms, ms / bucket))
+    return "\n".join(lines)
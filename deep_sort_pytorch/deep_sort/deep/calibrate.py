@@ -0,0 +1,73 @@
+"""
+Post-training static INT8 quantization of the ReID network for CPU inference.
+
+Activation ranges are calibrated on Market1501 training crops. The quantized
+network is saved as a TorchScript model that `Extractor` loads through
+`int8_model_path` (DEEPSORT.REID_INT8_CKPT in configs/deep_sort.yaml).
+Requires torch >= 1.13 (FX graph mode quantization).
+
+Accuracy and speed versus the float model:
+    python test.py && python evaluate.py
+    python calibrate.py --checkpoint checkpoint/ckpt.t7
+    python test.py --int8 checkpoint/ckpt_int8.pt && python evaluate.py
+"""
+import argparse
+import copy
+import os
+
+import torch
+import torchvision
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+from model import Net
+
+parser = argparse.ArgumentParser(description="Quantize on market1501")
+parser.add_argument("--data-dir", default='data', type=str)
+parser.add_argument("--checkpoint", default='./checkpoint/ckpt.t7', type=str,
+                    help="float checkpoint, as DEEPSORT.REID_CKPT")
+parser.add_argument("--num-batches", default=16, type=int)
+parser.add_argument("--backend", default='x86', type=str,
+                    help="quantized engine, 'x86', 'fbgemm' or 'qnnpack' (ARM)")
+parser.add_argument("--output", default='./checkpoint/ckpt_int8.pt', type=str)
+args = parser.parse_args()
+
+# data loader
+train_dir = os.path.join(args.data_dir, "train")
+transform = torchvision.transforms.Compose([
+    torchvision.transforms.Resize((128, 64)),
+    torchvision.transforms.ToTensor(),
+    torchvision.transforms.Normalize(
+        [0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+])
+calibloader = torch.utils.data.DataLoader(
+    torchvision.datasets.ImageFolder(train_dir, transform=transform),
+    batch_size=64, shuffle=True
+)
+
+# net definition
+net = Net(reid=True)
+assert os.path.isfile(args.checkpoint), "Error: no checkpoint file found!"
+print('Loading from {}'.format(args.checkpoint))
+checkpoint = torch.load(args.checkpoint, map_location="cpu")
+net.load_state_dict(checkpoint['net_dict'])
+net.eval()
+
+# fuse conv/bn/relu, insert observers and calibrate
+torch.backends.quantized.engine = args.backend
+example_inputs = (torch.randn(1, 3, 128, 64),)
+prepared = prepare_fx(
+    copy.deepcopy(net), get_default_qconfig_mapping(args.backend),
+    example_inputs)
+with torch.no_grad():
+    for idx, (inputs, _) in enumerate(calibloader):
+        if idx >= args.num_batches:
+            break
+        prepared(inputs)
+quantized = convert_fx(prepared)
+
+# save as TorchScript, such that Extractor does not need to rebuild the graph
+with torch.no_grad():
+    scripted = torch.jit.freeze(torch.jit.trace(quantized, example_inputs))
+torch.jit.save(scripted, args.output)
+print('Saved INT8 model to {}'.format(args.output))
@@ -0,0 +1,53 @@
+"""
+Export the inference-only ReID network: BatchNorm folded into the
+convolutions, classifier head stripped.
+
+The exported model is loaded by `Extractor` through `backend`
+(DEEPSORT.REID_BACKEND in configs/deep_sort.yaml, with DEEPSORT.REID_CKPT
+pointing to the exported file) without rebuilding `Net` or reading the
+training checkpoint:
+    python export.py --format torchscript   # backend "torchscript"
+    python export.py --format onnx          # backend "onnx", needs onnxruntime
+"""
+import argparse
+import os
+
+import torch
+
+from model import Net
+
+parser = argparse.ArgumentParser(description="Export the ReID network")
+parser.add_argument("--checkpoint", default='./checkpoint/ckpt.t7', type=str)
+parser.add_argument("--format", default='torchscript', type=str,
+                    choices=['torchscript', 'onnx'])
+parser.add_argument("--output", default=None, type=str,
+                    help="defaults to checkpoint/ckpt.pt or checkpoint/ckpt.onnx")
+args = parser.parse_args()
+
+# net definition
+net = Net(reid=True)
+assert os.path.isfile(args.checkpoint), "Error: no checkpoint file found!"
+print('Loading from {}'.format(args.checkpoint))
+checkpoint = torch.load(args.checkpoint, map_location="cpu")
+net.load_state_dict(checkpoint['net_dict'])
+net.eval()
+
+example_inputs = torch.randn(4, 3, 128, 64)
+with torch.no_grad():
+    reference = net(example_inputs)
+    net.fuse()
+    error = (net(example_inputs) - reference).abs().max().item()
+print('Folded BatchNorm, max feature difference {:.2e}'.format(error))
+
+if args.format == 'torchscript':
+    output = args.output or './checkpoint/ckpt.pt'
+    with torch.no_grad():
+        scripted = torch.jit.freeze(torch.jit.trace(net, example_inputs))
+    torch.jit.save(scripted, output)
+else:
+    output = args.output or './checkpoint/ckpt.onnx'
+    torch.onnx.export(
+        net, (example_inputs,), output, input_names=['input'],
+        output_names=['features'],
+        dynamic_axes={'input': {0: 'batch'}, 'features': {0: 'batch'}})
+print('Saved {} model to {}'.format(args.format, output))
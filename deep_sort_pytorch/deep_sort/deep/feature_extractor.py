@@ -1,46 +1,210 @@
 import torch
-import torchvision.transforms as transforms
 import numpy as np
 import cv2
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from torchvision.ops import roi_align
 
 from .model import Net
+from .autotune import autotune, load_profile, save_profile, format_profile
 
 
 class Extractor(object):
-    def __init__(self, model_path, use_cuda=True):
-        self.net = Net(reid=True)
-        self.device = "cuda" if torch.cuda.is_available() and use_cuda else "cpu"
-        state_dict = torch.load(model_path, map_location=torch.device(self.device))[
-            'net_dict']
-        self.net.load_state_dict(state_dict)
+    """
+    backend: how `model_path` is loaded,
+        "eager": training checkpoint, built as `Net` with BatchNorm folded
+        "torchscript": model exported by export.py (or calibrate.py)
+        "onnx": model exported by export.py, run with ONNX Runtime on the CPU
+    batch_buckets: if given, the crops are forwarded in chunks padded to
+        these batch sizes instead of the number of crops of the frame
+    profile_path: JSON batch profile (see autotune.py); measured on this
+        host and saved on first use, then loaded. Sets the batch buckets and
+        the number of torch threads.
+
+    `extract_boxes` crops and resizes all boxes of a frame with a single
+    roi_align call on the GPU (`batch_resample`). On the CPU, resizing every
+    crop with cv2.resize in uint8 is faster than any single resample call
+    over the frame (cv2.remap, roi_align or a gather), so the crops are
+    resized one by one there.
+    """
+
+    def __init__(self, model_path, use_cuda=True, preprocess_workers=0,
+                 int8_model_path=None, backend="eager", batch_buckets=None,
+                 profile_path=None):
         logger = logging.getLogger("root.tracker")
-        logger.info("Loading weights from {}... Done!".format(model_path))
-        self.net.to(self.device)
+        self.device = "cuda" if torch.cuda.is_available() and use_cuda else "cpu"
+        self.backend = backend
+        if int8_model_path:
+            # INT8 TorchScript model from calibrate.py; quantized kernels
+            # only run on the CPU.
+            self.device = "cpu"
+            self.backend = "torchscript"
+            model_path = int8_model_path
+        if self.backend == "eager":
+            self.net = Net(reid=True)
+            state_dict = torch.load(model_path, map_location=torch.device(self.device))[
+                'net_dict']
+            self.net.load_state_dict(state_dict)
+            self.net.eval().fuse()
+        elif self.backend == "torchscript":
+            self.net = torch.jit.load(model_path, map_location=self.device)
+        elif self.backend == "onnx":
+            import onnxruntime
+            self.device = "cpu"
+            self.net = onnxruntime.InferenceSession(
+                model_path, providers=["CPUExecutionProvider"])
+        else:
+            raise ValueError("Unknown ReID backend: {}".format(backend))
+        logger.info("Loading {} model from {}... Done!".format(
+            self.backend, model_path))
+        if self.backend != "onnx":
+            self.net.to(self.device)
         self.size = (64, 128)
-        self.norm = transforms.Compose([
-            transforms.ToTensor(),
-            transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
-        ])
+        # Normalization with the ImageNet mean/std, folded into one
+        # multiply-add on 0-255 input.
+        mean = torch.tensor([0.485, 0.456, 0.406]).view(1, 3, 1, 1)
+        std = torch.tensor([0.229, 0.224, 0.225]).view(1, 3, 1, 1)
+        self.norm_scale = (1. / (255. * std)).to(self.device)
+        self.norm_shift = (-mean / std).to(self.device)
 
-    def _preprocess(self, im_crops):
+        # cv2 releases the GIL, so crops can be resized concurrently.
+        self.executor = None
+        if preprocess_workers > 0:
+            self.executor = ThreadPoolExecutor(preprocess_workers)
+        self.batch_resample = self.device == "cuda"
+
+        # Batch buffers, grown to the largest batch seen (see `_reserve`).
+        self._crops = np.zeros((0, self.size[1], self.size[0], 3), np.uint8)
+        self._input = torch.zeros((0, 3, self.size[1], self.size[0]))
+
+        self.batch_buckets = sorted(batch_buckets) if batch_buckets else None
+        if profile_path:
+            profile = load_profile(profile_path, self)
+            if profile is None:
+                profile = autotune(self)
+                save_profile(profile, profile_path)
+            torch.set_num_threads(profile["num_threads"])
+            self.batch_buckets = profile["buckets"]
+            logger.info(format_profile(profile))
+
+    def _reserve(self, batch_size):
         """
-        TODO:
-            1. to float with scale from 0 to 1
-            2. resize to (64, 128) as Market1501 dataset did
-            3. concatenate to a numpy array
-            3. to torch Tensor
-            4. normalize
+        Grow the batch buffers such that they hold at least `batch_size`
+        crops. Host buffers are pinned when running on the GPU.
         """
-        def _resize(im, size):
-            return cv2.resize(im.astype(np.float32)/255., size)
+        if batch_size <= len(self._crops):
+            return
+        width, height = self.size
+        self._crops = np.zeros((batch_size, height, width, 3), np.uint8)
+        self._input = torch.zeros(
+            (batch_size, 3, height, width), pin_memory=self.device == "cuda")
+
+    def _chunks(self, num_crops):
+        """
+        Batch sizes to forward `num_crops` crops with: full chunks of the
+        largest bucket, then the smallest bucket that holds the rest.
+        """
+        if not self.batch_buckets:
+            return [num_crops]
+        largest = self.batch_buckets[-1]
+        chunks = [largest] * (num_crops // largest)
+        rest = num_crops % largest
+        if rest:
+            chunks.append(next(b for b in self.batch_buckets if b >= rest))
+        return chunks
+
+    def _preprocess(self, im_crops, batch_size=None):
+        """
+        Resize the crops to (64, 128) as Market1501 dataset did, in uint8 and
+        straight into the batch buffer, then normalize the whole batch.
+
+        batch_size: number of rows to normalize, at least len(im_crops); the
+            extra rows are padding with stale content.
+        """
+        batch_size = batch_size or len(im_crops)
+        self._reserve(batch_size)
+        crops = self._crops[:batch_size]
+
+        def _resize(i):
+            cv2.resize(im_crops[i], self.size, dst=crops[i])
 
-        im_batch = torch.cat([self.norm(_resize(im, self.size)).unsqueeze(
-            0) for im in im_crops], dim=0).float()
-        return im_batch
+        if self.executor is not None and len(im_crops) > 1:
+            list(self.executor.map(_resize, range(len(im_crops))))
+        else:
+            for i in range(len(im_crops)):
+                _resize(i)
+        return self._normalize(crops)
+
+    def _preprocess_boxes(self, img, boxes, batch_size=None):
+        """
+        Crop all boxes from the frame and resize them to (64, 128) with one
+        roi_align call on the uploaded frame, then normalize the batch in
+        place. Every output pixel is a single bilinear sample at the source
+        position cv2.resize uses, so the result matches `_preprocess` on the
+        cropped images up to uint8 rounding (and, when upscaling, the pixels
+        next to the box being used instead of clamping at its border).
+
+        img: HxWx3 uint8 frame
+        boxes: Nx4 integer array of (x1, y1, x2, y2), x2 and y2 exclusive
+        batch_size: number of rows, at least len(boxes); the extra rows
+            repeat the last box.
+        """
+        batch_size = batch_size or len(boxes)
+        frame = torch.from_numpy(np.ascontiguousarray(img)).to(self.device)
+        frame = frame.permute(2, 0, 1)[None].float()
+        rois = torch.zeros((batch_size, 5))
+        rois[:len(boxes), 1:] = torch.from_numpy(np.asarray(boxes, np.float32))
+        rois[len(boxes):, 1:] = rois[len(boxes) - 1, 1:]
+        width, height = self.size
+        im_batch = roi_align(frame, rois.to(self.device), (height, width),
+                             sampling_ratio=1, aligned=True)
+        return torch.addcmul(
+            self.norm_shift, im_batch, self.norm_scale, out=im_batch)
+
+    def _normalize(self, crops):
+        """
+        Convert a batch of NxHxWx3 uint8 crops into the normalized Nx3xHxW
+        float input of the network, reusing the input buffer.
+
+        The returned tensor is only valid until the next call.
+        """
+        im_batch = self._input[:len(crops)]
+        im_batch.copy_(torch.from_numpy(crops).permute(0, 3, 1, 2))
+        im_batch = im_batch.to(self.device, non_blocking=True)
+        return torch.addcmul(
+            self.norm_shift, im_batch, self.norm_scale, out=im_batch)
 
     def __call__(self, im_crops):
-        im_batch = self._preprocess(im_crops)
+        chunks = self._chunks(len(im_crops))
+        im_batch = self._preprocess(im_crops, sum(chunks))
+        return self._forward_chunks(im_batch, chunks)[:len(im_crops)]
+
+    def extract_boxes(self, img, boxes):
+        """
+        Compute the features of all boxes of a frame.
+
+        img: HxWx3 uint8 frame
+        boxes: Nx4 integer array of (x1, y1, x2, y2), x2 and y2 exclusive
+        """
+        if not self.batch_resample:
+            return self([img[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes])
+        chunks = self._chunks(len(boxes))
+        im_batch = self._preprocess_boxes(img, boxes, sum(chunks))
+        return self._forward_chunks(im_batch, chunks)[:len(boxes)]
+
+    def _forward_chunks(self, im_batch, chunks):
+        if len(chunks) == 1:
+            return self._forward(im_batch)
+        features = []
+        start = 0
+        for size in chunks:
+            features.append(self._forward(im_batch[start:start + size]))
+            start += size
+        return np.concatenate(features)
+
+    def _forward(self, im_batch):
+        if self.backend == "onnx":
+            return self.net.run(None, {"input": im_batch.numpy()})[0]
         with torch.no_grad():
             im_batch = im_batch.to(self.device)
             features = self.net(im_batch)
@@ -1,6 +1,7 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 
 
 class BasicBlock(nn.Module):
@@ -40,6 +41,15 @@ class BasicBlock(nn.Module):
             x = self.downsample(x)
         return F.relu(x.add(y), True)
 
+    def fuse(self):
+        self.conv1 = fuse_conv_bn_eval(self.conv1, self.bn1)
+        self.bn1 = nn.Identity()
+        self.conv2 = fuse_conv_bn_eval(self.conv2, self.bn2)
+        self.bn2 = nn.Identity()
+        if self.is_downsample:
+            self.downsample = fuse_conv_bn_eval(
+                self.downsample[0], self.downsample[1])
+
 
 def make_layers(c_in, c_out, repeat_times, is_downsample=False):
     blocks = []
@@ -100,6 +110,22 @@ class Net(nn.Module):
         x = self.classifier(x)
         return x
 
+    def fuse(self):
+        """
+        Build the inference-only network in place: fold every BatchNorm2d
+        into the preceding convolution and drop the classifier head, which
+        is unused in reid mode. The network must be in eval mode with its
+        weights loaded.
+        """
+        assert self.reid and not self.training
+        self.conv[0] = fuse_conv_bn_eval(self.conv[0], self.conv[1])
+        self.conv[1] = nn.Identity()
+        for layer in (self.layer1, self.layer2, self.layer3, self.layer4):
+            for block in layer:
+                block.fuse()
+        del self.classifier
+        return self
+
 
 if __name__ == '__main__':
     net = Net()
@@ -0,0 +1,129 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class _Request(object):
+    __slots__ = ('img', 'boxes', 'future', 'submitted')
+
+    def __init__(self, img, boxes):
+        self.img = img
+        self.boxes = boxes
+        self.future = Future()
+        self.submitted = time.perf_counter()
+
+
+class ReIDService(object):
+    """
+    Computes the ReID features of crop requests from many trackers in shared
+    batches. A worker thread takes the first waiting request, adds the ones
+    arriving within `max_wait` seconds of its submission (until the batch
+    holds `max_batch_size` crops), runs a single forward pass of the
+    extractor and scatters the features back.
+
+    It has the `extract_boxes` interface of `Extractor`, so it can replace
+    the extractor of `DeepSort` instances updated in parallel threads.
+
+    Parameters
+    ----------
+    extractor : Extractor
+    max_batch_size : int
+        Close the batch early when it holds this many crops.
+    max_wait : float
+        Deadline in seconds, counted from the submission of the first
+        request of a batch. Trades request latency for batch size.
+
+    Attributes
+    ----------
+    num_batches, num_requests, num_crops : int
+    queue_wait : float
+        Seconds requests waited before their batch started, summed.
+    forward_time : float
+        Seconds spent in the extractor, summed.
+    """
+
+    def __init__(self, extractor, max_batch_size=64, max_wait=0.005):
+        self.extractor = extractor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.num_batches = 0
+        self.num_requests = 0
+        self.num_crops = 0
+        self.queue_wait = 0.
+        self.forward_time = 0.
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, img, boxes):
+        """
+        Queue the crops `boxes` (Nx4 integer x1, y1, x2, y2) of `img`.
+        Returns a Future of their NxD features.
+        """
+        request = _Request(img, boxes)
+        self._queue.put(request)
+        return request.future
+
+    def extract_boxes(self, img, boxes):
+        return self.submit(img, boxes).result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, request):
+        batch = [request]
+        size = len(request.boxes)
+        deadline = request.submitted + self.max_wait
+        while size < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+            size += len(request.boxes)
+        return batch
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = self._collect(request)
+            start = time.perf_counter()
+            try:
+                crops = [r.img[y1:y2, x1:x2] for r in batch for x1, y1, x2, y2 in r.boxes]
+                features = self.extractor(crops)
+            except Exception as e:
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+            end = time.perf_counter()
+
+            self.num_batches += 1
+            self.num_requests += len(batch)
+            self.num_crops += len(crops)
+            self.queue_wait += sum(start - r.submitted for r in batch)
+            self.forward_time += end - start
+
+            splits = np.cumsum([len(r.boxes) for r in batch])[:-1]
+            for r, f in zip(batch, np.split(features, splits)):
+                r.future.set_result(f)
+
+    def report(self):
+        """Mean queue wait per request, batch size and forward latency."""
+        batches = max(self.num_batches, 1)
+        return ('ReID service: %d requests in %d batches, %.1f crops per batch, '
+                '%.1f ms queue wait per request, %.1f ms forward per batch' % (
+                    self.num_requests, self.num_batches, self.num_crops / batches,
+                    1000. * self.queue_wait / max(self.num_requests, 1),
+                    1000. * self.forward_time / batches))
@@ -4,6 +4,7 @@ import torchvision
 
 import argparse
 import os
+import time
 
 from model import Net
 
@@ -11,11 +12,15 @@ parser = argparse.ArgumentParser(description="Train on market1501")
 parser.add_argument("--data-dir", default='data', type=str)
 parser.add_argument("--no-cuda", action="store_true")
 parser.add_argument("--gpu-id", default=0, type=int)
+parser.add_argument("--int8", default='', type=str,
+                    help="evaluate an INT8 model saved by calibrate.py (CPU)")
 args = parser.parse_args()
 
 # device
 device = "cuda:{}".format(
     args.gpu_id) if torch.cuda.is_available() and not args.no_cuda else "cpu"
+if args.int8:
+    device = "cpu"  # quantized kernels only run on the CPU
 if torch.cuda.is_available() and not args.no_cuda:
     cudnn.benchmark = True
 
@@ -39,13 +44,17 @@ galleryloader = torch.utils.data.DataLoader(
 )
 
 # net definition
-net = Net(reid=True)
-assert os.path.isfile(
-    "./checkpoint/ckpt.t7"), "Error: no checkpoint file found!"
-print('Loading from checkpoint/ckpt.t7')
-checkpoint = torch.load("./checkpoint/ckpt.t7")
-net_dict = checkpoint['net_dict']
-net.load_state_dict(net_dict, strict=False)
+if args.int8:
+    print('Loading INT8 model from {}'.format(args.int8))
+    net = torch.jit.load(args.int8, map_location="cpu")
+else:
+    net = Net(reid=True)
+    assert os.path.isfile(
+        "./checkpoint/ckpt.t7"), "Error: no checkpoint file found!"
+    print('Loading from checkpoint/ckpt.t7')
+    checkpoint = torch.load("./checkpoint/ckpt.t7")
+    net_dict = checkpoint['net_dict']
+    net.load_state_dict(net_dict, strict=False)
 net.eval()
 net.to(device)
 
@@ -54,20 +63,30 @@ query_features = torch.tensor([]).float()
 query_labels = torch.tensor([]).long()
 gallery_features = torch.tensor([]).float()
 gallery_labels = torch.tensor([]).long()
+forward_time, num_images = 0., 0
 
 with torch.no_grad():
     for idx, (inputs, labels) in enumerate(queryloader):
         inputs = inputs.to(device)
+        start = time.time()
         features = net(inputs).cpu()
+        forward_time += time.time() - start
+        num_images += inputs.size(0)
         query_features = torch.cat((query_features, features), dim=0)
         query_labels = torch.cat((query_labels, labels))
 
     for idx, (inputs, labels) in enumerate(galleryloader):
         inputs = inputs.to(device)
+        start = time.time()
         features = net(inputs).cpu()
+        forward_time += time.time() - start
+        num_images += inputs.size(0)
         gallery_features = torch.cat((gallery_features, features), dim=0)
         gallery_labels = torch.cat((gallery_labels, labels))
 
+print("Forward time: {:.3f}s for {} images ({:.2f}ms per image)".format(
+    forward_time, num_images, 1000. * forward_time / num_images))
+
 gallery_labels -= 2
 
 # save features
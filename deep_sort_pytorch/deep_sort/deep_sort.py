@@ -1,55 +1,139 @@
+import copy
+
 import numpy as np
 import torch
 
 from .deep.feature_extractor import Extractor
 from .sort.nn_matching import NearestNeighborDistanceMetric
-from .sort.detection import Detection
+from .sort.detection import DetectionBatch
+from .sort.reid_scheduler import ReIDScheduler
 from .sort.tracker import Tracker
 
 
-__all__ = ['DeepSort']
+__all__ = ['DeepSort', 'TRACK_DTYPE']
+
+# One row of DeepSort.update_batch output per track.
+TRACK_DTYPE = np.dtype([
+    ('x1', np.int32), ('y1', np.int32), ('x2', np.int32), ('y2', np.int32),
+    ('track_id', np.int32), ('class', np.int32), ('conf', np.float32)])
 
 
 class DeepSort(object):
-    def __init__(self, model_path, max_dist=0.2, min_confidence=0.3, nms_max_overlap=1.0, max_iou_distance=0.7, max_age=70, n_init=3, nn_budget=100, use_cuda=True):
+    def __init__(self, model_path, max_dist=0.2, min_confidence=0.3, nms_max_overlap=1.0, max_iou_distance=0.7, max_age=70, n_init=3, nn_budget=100, use_cuda=True, assignment_backend="hungarian", preprocess_workers=0, reid_refresh_interval=1, lazy_reid=False, int8_model_path=None, reid_backend="eager", reid_batch_buckets=None, reid_profile=None):
         self.min_confidence = min_confidence
+        self.lazy_reid = lazy_reid
         self.nms_max_overlap = nms_max_overlap
 
-        self.extractor = Extractor(model_path, use_cuda=use_cuda)
+        self.extractor = Extractor(
+            model_path, use_cuda=use_cuda, preprocess_workers=preprocess_workers,
+            int8_model_path=int8_model_path, backend=reid_backend,
+            batch_buckets=reid_batch_buckets, profile_path=reid_profile)
+
+        self._tracker_args = dict(
+            max_dist=max_dist, nn_budget=nn_budget, max_iou_distance=max_iou_distance,
+            max_age=max_age, n_init=n_init, assignment_backend=assignment_backend,
+            reid_refresh_interval=reid_refresh_interval)
+        self._init_tracker(**self._tracker_args)
 
+    def _init_tracker(self, max_dist, nn_budget, max_iou_distance, max_age, n_init,
+                      assignment_backend, reid_refresh_interval):
         max_cosine_distance = max_dist
         metric = NearestNeighborDistanceMetric(
             "cosine", max_cosine_distance, nn_budget)
         self.tracker = Tracker(
-            metric, max_iou_distance=max_iou_distance, max_age=max_age, n_init=n_init)
+            metric, max_iou_distance=max_iou_distance, max_age=max_age, n_init=n_init,
+            assignment_backend=assignment_backend)
+        self.reid_scheduler = ReIDScheduler(reid_refresh_interval)
+
+    def spawn(self):
+        """
+        Create a DeepSort with the same settings and empty tracker state, for
+        another video stream. The ReID extractor (weights and batch buffers)
+        is shared, so the streams must be updated one after another, unless
+        the extractor is a ReIDService.
+        """
+        other = copy.copy(self)
+        other._init_tracker(**self._tracker_args)
+        return other
 
     def update(self, bbox_xywh, confidences, ori_img):
+        bbox_xywh = np.asarray(bbox_xywh, dtype=np.float64).reshape(-1, 4)
+        dets = np.full((len(bbox_xywh), 6), -1.)
+        dets[:, :2] = bbox_xywh[:, :2] - bbox_xywh[:, 2:] / 2.
+        dets[:, 2:4] = bbox_xywh[:, :2] + bbox_xywh[:, 2:] / 2.
+        dets[:, 4] = np.asarray(confidences).reshape(-1)
+
+        tracks = self.update_batch(dets, ori_img)
+        if len(tracks) == 0:
+            return []
+        return np.stack([tracks['x1'], tracks['y1'], tracks['x2'],
+                         tracks['y2'], tracks['track_id']], axis=1)
+
+    def update_batch(self, dets, ori_img):
+        """
+        Run the tracker on all detections of a frame without creating one
+        Python object per detection.
+
+        dets: Nx6 array or tensor of (x1, y1, x2, y2, confidence, class)
+        returns: structured array of dtype TRACK_DTYPE with one row per
+            confirmed track that was updated in this frame
+        """
+        if isinstance(dets, torch.Tensor):
+            dets = dets.detach().cpu().numpy()
+        dets = np.asarray(dets, dtype=np.float64).reshape(-1, 6)
+        dets = dets[dets[:, 4] > self.min_confidence]
         self.height, self.width = ori_img.shape[:2]
-        # generate detections
-        features = self._get_features(bbox_xywh, ori_img)
-        bbox_tlwh = self._xywh_to_tlwh(bbox_xywh)
-        detections = [Detection(bbox_tlwh[i], conf, features[i]) for i, conf in enumerate(
-            confidences) if conf > self.min_confidence]
+        self.tracker.predict()
+
+        bbox_tlwh = dets[:, :4].copy()
+        bbox_tlwh[:, 2:] -= bbox_tlwh[:, :2]
+        detections = DetectionBatch(bbox_tlwh, dets[:, 4], dets[:, 5])
+
+        # reuse track embeddings where unambiguous
+        reuse = self.reid_scheduler.select(self.tracker.tracks, bbox_tlwh)
+        reused = np.flatnonzero(reuse >= 0)
+        detections.set_features(reused, [
+            self.tracker.tracks[track_idx].last_feature
+            for track_idx in reuse[reused]], reused=True)
 
-        # run on non-maximum supression
-        boxes = np.array([d.tlwh for d in detections])
-        scores = np.array([d.confidence for d in detections])
+        def feature_provider(detection_indices):
+            return self._get_features(bbox_tlwh[detection_indices], ori_img)
+
+        # in lazy mode, the tracker requests only the features it needs
+        if not self.lazy_reid:
+            extract = np.flatnonzero(reuse < 0)
+            detections.set_features(extract, feature_provider(extract))
 
         # update tracker
-        self.tracker.predict()
-        self.tracker.update(detections)
+        self.tracker.update(
+            detections, feature_provider if self.lazy_reid else None)
+        return self._outputs()
+
+    def propagate(self, ori_img):
+        """
+        Advance the tracks by one frame on which the detector did not run,
+        by Kalman prediction only. Returns the same structured array as
+        `update_batch`, with the predicted boxes.
+        """
+        self.height, self.width = ori_img.shape[:2]
+        self.tracker.propagate()
+        return self._outputs()
 
+    def _outputs(self):
         # output bbox identities
-        outputs = []
-        for track in self.tracker.tracks:
-            if not track.is_confirmed() or track.time_since_update > 1:
-                continue
-            box = track.to_tlwh()
-            x1, y1, x2, y2 = self._tlwh_to_xyxy(box)
-            track_id = track.track_id
-            outputs.append(np.array([x1, y1, x2, y2, track_id], dtype=np.int))
-        if len(outputs) > 0:
-            outputs = np.stack(outputs, axis=0)
+        tracks = [t for t in self.tracker.tracks
+                  if t.is_confirmed() and t.time_since_update <= 1]
+        xyah = self.tracker.store.mean[[t.slot for t in tracks], :4]
+        wh = np.c_[xyah[:, 2] * xyah[:, 3], xyah[:, 3]]
+        tl = xyah[:, :2] - wh / 2.
+        outputs = np.zeros(len(tracks), dtype=TRACK_DTYPE)
+        outputs['x1'] = np.maximum(tl[:, 0].astype(np.int64), 0)
+        outputs['y1'] = np.maximum(tl[:, 1].astype(np.int64), 0)
+        outputs['x2'] = np.minimum((tl[:, 0] + wh[:, 0]).astype(np.int64), self.width - 1)
+        outputs['y2'] = np.minimum((tl[:, 1] + wh[:, 1]).astype(np.int64), self.height - 1)
+        outputs['track_id'] = [t.track_id for t in tracks]
+        outputs['class'] = [t.class_id for t in tracks]
+        outputs['conf'] = [t.confidence for t in tracks]
         return outputs
 
     """
@@ -100,14 +184,15 @@ class DeepSort(object):
         h = int(y2 - y1)
         return t, l, w, h
 
-    def _get_features(self, bbox_xywh, ori_img):
-        im_crops = []
-        for box in bbox_xywh:
-            x1, y1, x2, y2 = self._xywh_to_xyxy(box)
-            im = ori_img[y1:y2, x1:x2]
-            im_crops.append(im)
-        if im_crops:
-            features = self.extractor(im_crops)
-        else:
-            features = np.array([])
-        return features
+    def _get_features(self, bbox_tlwh, ori_img):
+        if len(bbox_tlwh) == 0:
+            return np.array([])
+        # Same clipping as _tlwh_to_xyxy, for all boxes at once.
+        x, y, w, h = np.asarray(bbox_tlwh).T
+        boxes = np.stack([
+            np.maximum(x.astype(np.int64), 0),
+            np.maximum(y.astype(np.int64), 0),
+            np.minimum((x + w).astype(np.int64), self.width - 1),
+            np.minimum((y + h).astype(np.int64), self.height - 1),
+        ], axis=1)
+        return self.extractor.extract_boxes(ori_img, boxes)
@@ -12,8 +12,13 @@ class Detection(object):
         Bounding box in format `(x, y, w, h)`.
     confidence : float
         Detector confidence score.
-    feature : array_like
+    feature : array_like | NoneType
         A feature vector that describes the object contained in this image.
+        May be None if the feature is computed on demand (see
+        `Tracker.update`).
+    reused_feature : Optional[bool]
+        True if `feature` is the embedding of a track rather than one computed
+        for this detection (see `reid_scheduler.ReIDScheduler`).
 
     Attributes
     ----------
@@ -23,13 +28,18 @@ class Detection(object):
         Detector confidence score.
     feature : ndarray | NoneType
         A feature vector that describes the object contained in this image.
+    reused_feature : bool
+        True if `feature` is the embedding of a track.
 
     """
 
-    def __init__(self, tlwh, confidence, feature):
-        self.tlwh = np.asarray(tlwh, dtype=np.float)
+    def __init__(self, tlwh, confidence, feature, reused_feature=False):
+        self.tlwh = np.asarray(tlwh, dtype=np.float64)
         self.confidence = float(confidence)
-        self.feature = np.asarray(feature, dtype=np.float32)
+        self.feature = None
+        if feature is not None:
+            self.feature = np.asarray(feature, dtype=np.float32)
+        self.reused_feature = reused_feature
 
     def to_tlbr(self):
         """Convert bounding box to format `(min x, min y, max x, max y)`, i.e.,
@@ -47,3 +57,121 @@ class Detection(object):
         ret[:2] += ret[2:] / 2
         ret[2] /= ret[3]
         return ret
+
+
+class DetectionBatch(object):
+    """
+    This class represents all bounding box detections in a single image,
+    stored column-wise (one array per attribute, one row per detection).
+
+    Parameters
+    ----------
+    tlwh : array_like
+        An Nx4 matrix of bounding boxes in format `(x, y, w, h)`.
+    confidence : array_like
+        Detector confidence scores, one per detection.
+    class_id : Optional[array_like]
+        Detector class labels, one per detection. Defaults to -1.
+    feature : Optional[array_like]
+        An NxM matrix of feature vectors. If None, features can be filled in
+        later with `set_features`.
+
+    Attributes
+    ----------
+    tlwh : ndarray
+        Bounding boxes in format `(top left x, top left y, width, height)`.
+    confidence : ndarray
+        Detector confidence scores.
+    class_id : ndarray
+        Detector class labels.
+    feature : ndarray | NoneType
+        An NxM matrix of feature vectors, or None if no feature is set. Rows
+        with `has_feature` False are undefined.
+    has_feature : ndarray
+        Boolean mask of the detections that have a feature vector.
+    reused_feature : ndarray
+        Boolean mask of the detections whose feature is the embedding of a
+        track (see `Detection`).
+
+    """
+
+    def __init__(self, tlwh, confidence, class_id=None, feature=None):
+        self.tlwh = np.asarray(tlwh, dtype=np.float64).reshape(-1, 4)
+        self.confidence = np.asarray(confidence, dtype=np.float64).reshape(-1)
+        if class_id is None:
+            class_id = np.full(len(self.tlwh), -1)
+        self.class_id = np.asarray(class_id, dtype=np.int64).reshape(-1)
+        self.feature = None
+        self.has_feature = np.zeros(len(self.tlwh), dtype=bool)
+        self.reused_feature = np.zeros(len(self.tlwh), dtype=bool)
+        if feature is not None:
+            self.set_features(np.arange(len(self.tlwh)), feature)
+        self._xyah = None
+
+    @classmethod
+    def from_detections(cls, detections):
+        """Create a batch from a list of `Detection` objects."""
+        batch = cls(
+            [d.tlwh for d in detections], [d.confidence for d in detections])
+        for reused in (False, True):
+            indices = [i for i, d in enumerate(detections)
+                       if d.feature is not None and d.reused_feature == reused]
+            if indices:
+                batch.set_features(
+                    indices, [detections[i].feature for i in indices], reused)
+        return batch
+
+    def __len__(self):
+        return len(self.tlwh)
+
+    def __getitem__(self, index):
+        """Get the detection at `index` as a `Detection` object."""
+        return Detection(
+            self.tlwh[index], self.confidence[index], self.get_feature(index),
+            bool(self.reused_feature[index]))
+
+    def get_feature(self, index):
+        """Returns the feature vector of a single detection, or None."""
+        return self.feature[index] if self.has_feature[index] else None
+
+    def set_features(self, indices, features, reused=False):
+        """Set the feature vectors of the detections at `indices`.
+
+        Parameters
+        ----------
+        indices : array_like
+            Detection indices.
+        features : array_like
+            A matrix of feature vectors, one row per entry in `indices`.
+        reused : Optional[bool]
+            True if the features are track embeddings.
+
+        """
+        features = np.asarray(features, dtype=np.float32)
+        if len(features) == 0:
+            return
+        if self.feature is None:
+            self.feature = np.zeros(
+                (len(self.tlwh), features.shape[1]), dtype=np.float32)
+        self.feature[indices] = features
+        self.has_feature[indices] = True
+        self.reused_feature[indices] = reused
+
+    def to_tlbr(self):
+        """Convert bounding boxes to format `(min x, min y, max x, max y)`.
+        """
+        ret = self.tlwh.copy()
+        ret[:, 2:] += ret[:, :2]
+        return ret
+
+    def to_xyah(self):
+        """Convert bounding boxes to format `(center x, center y, aspect ratio,
+        height)`, where the aspect ratio is `width / height`. The result is
+        computed once and must not be modified.
+        """
+        if self._xyah is None:
+            ret = self.tlwh.copy()
+            ret[:, :2] += ret[:, 2:] / 2
+            ret[:, 2] /= ret[:, 3]
+            self._xyah = ret
+        return self._xyah
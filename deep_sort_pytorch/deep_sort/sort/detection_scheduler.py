@@ -0,0 +1,155 @@
+# vim: expandtab:ts=4:sw=4
+import numpy as np
+
+
+class DetectionScheduler(object):
+    """
+    Decides on which frames the detector (and ReID) runs. On the frames in
+    between, the tracker only propagates its tracks with the Kalman filter
+    (see `Tracker.propagate`).
+
+    With a fixed stride the detector runs on every `max_stride`-th frame.
+    With `adaptive`, the stride is recomputed after every detection frame
+    and shrinks for crowded scenes and fast motion:
+
+    * while there are tentative tracks, whose velocity is not known yet,
+      the detector runs on every frame;
+    * with more than `max_tracks` confirmed tracks, the stride is scaled
+      down by `max_tracks / number of tracks`;
+    * the fastest confirmed track must not move more than
+      `max_displacement` times its box height between two detections.
+
+    Parameters
+    ----------
+    max_stride : int
+        Number of frames per detection frame; 1 detects on every frame.
+    adaptive : bool
+        If True, `max_stride` is the upper bound of an adaptive stride.
+    max_tracks : int
+        Number of confirmed tracks up to which the full stride is used.
+    max_displacement : float
+        Motion between two detection frames, relative to the box height.
+
+    Attributes
+    ----------
+    stride : int
+        The current stride.
+    num_detected : int
+        Number of detection frames so far.
+    num_propagated : int
+        Number of frames on which the detector was skipped so far.
+
+    """
+
+    def __init__(self, max_stride=1, adaptive=False, max_tracks=20,
+                 max_displacement=0.5):
+        self.max_stride = max_stride
+        self.adaptive = adaptive
+        self.max_tracks = max_tracks
+        self.max_displacement = max_displacement
+        self.stride = max_stride
+        self.num_detected = 0
+        self.num_propagated = 0
+        self._frames_since_detection = max_stride
+
+    def is_keyframe(self):
+        """Returns True if the detector must run on the next frame."""
+        if self._frames_since_detection >= self.stride:
+            self._frames_since_detection = 1
+            self.num_detected += 1
+            return True
+        self._frames_since_detection += 1
+        self.num_propagated += 1
+        return False
+
+    def update(self, trackers):
+        """Recompute the adaptive stride after a detection frame.
+
+        Parameters
+        ----------
+        trackers : List[tracker.Tracker]
+            The trackers of all streams that share the detector; the most
+            demanding one sets the stride.
+
+        """
+        if not self.adaptive:
+            return
+        stride = self.max_stride
+        for tracker in trackers:
+            if any(t.is_tentative() for t in tracker.tracks):
+                stride = 1
+            slots = [t.slot for t in tracker.tracks if t.is_confirmed()]
+            if len(slots) > self.max_tracks:
+                stride = min(stride, int(
+                    self.max_stride * self.max_tracks / len(slots)))
+            if len(slots) > 0:
+                mean = tracker.store.mean[slots]
+                speed = np.hypot(mean[:, 4], mean[:, 5]) / np.maximum(
+                    mean[:, 3], 1.)
+                if speed.max() > 0:
+                    stride = min(stride, int(
+                        self.max_displacement / speed.max()))
+        self.stride = max(stride, 1)
+
+
+class ResolutionScheduler(object):
+    """
+    Picks the detector input size per frame from `sizes`: the smallest size
+    at which the smallest live track is still `min_height` input pixels
+    high. Without live tracks, and on every `probe_interval`-th frame to
+    catch small newcomers, the largest size is used.
+
+    Parameters
+    ----------
+    sizes : List[int]
+        Stride-aligned input sizes (long side of the letterboxed frame).
+    min_height : float
+        Minimum track height in input pixels.
+    probe_interval : int
+        Run at the largest size at least every `probe_interval` frames.
+
+    Attributes
+    ----------
+    counts : Dict[int, int]
+        Number of frames per selected size so far.
+
+    """
+
+    def __init__(self, sizes, min_height=32, probe_interval=30):
+        self.sizes = sorted(sizes)
+        self.min_height = min_height
+        self.probe_interval = probe_interval
+        self.counts = {size: 0 for size in self.sizes}
+        self._relative_height = None
+        self._frames_since_probe = 0
+
+    def update(self, trackers, frame_sizes):
+        """Record the smallest live track after a tracked frame.
+
+        Parameters
+        ----------
+        trackers : List[tracker.Tracker]
+            The trackers of all streams that share the detector.
+        frame_sizes : List[int]
+            The long side of the frames of each stream, in pixels.
+
+        """
+        relative = []
+        for tracker, frame_size in zip(trackers, frame_sizes):
+            slots = [t.slot for t in tracker.tracks if t.time_since_update <= 1]
+            if len(slots) > 0:
+                relative.append(tracker.store.mean[slots, 3].min() / frame_size)
+        self._relative_height = min(relative) if relative else None
+
+    def select(self):
+        """Returns the input size for the next detection frame."""
+        self._frames_since_probe += 1
+        size = self.sizes[-1]
+        if self._relative_height is not None and \
+                self._frames_since_probe < self.probe_interval:
+            size = next((s for s in self.sizes
+                         if self._relative_height * s >= self.min_height), size)
+        if size == self.sizes[-1]:
+            self._frames_since_probe = 0
+        self.counts[size] += 1
+        return size
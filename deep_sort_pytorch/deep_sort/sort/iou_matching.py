@@ -39,22 +39,79 @@ def iou(bbox, candidates):
     return area_intersection / (area_bbox + area_candidates - area_intersection)
 
 
+def iou_matrix(bboxes, candidates, metric="iou"):
+    """Compute pair-wise overlap between two sets of bounding boxes.
+
+    Parameters
+    ----------
+    bboxes : ndarray
+        An Nx4 matrix of bounding boxes in format `(top left x, top left y,
+        width, height)`.
+    candidates : ndarray
+        An Mx4 matrix of candidate bounding boxes in the same format as
+        `bboxes`.
+    metric : Optional[str]
+        One of "iou" (intersection over union), "giou" (generalized IoU, which
+        subtracts the fraction of the enclosing box not covered by the union)
+        or "diou" (distance IoU, which subtracts the squared center distance
+        normalized by the squared diagonal of the enclosing box).
+
+    Returns
+    -------
+    ndarray
+        Returns an NxM matrix where element (i, j) contains the overlap
+        between `bboxes[i]` and `candidates[j]`. The IoU lies in [0, 1], GIoU
+        and DIoU lie in [-1, 1].
+
+    """
+    bboxes_tl = bboxes[:, np.newaxis, :2]
+    bboxes_br = bboxes_tl + bboxes[:, np.newaxis, 2:]
+    candidates_tl = candidates[np.newaxis, :, :2]
+    candidates_br = candidates_tl + candidates[np.newaxis, :, 2:]
+
+    tl = np.maximum(bboxes_tl, candidates_tl)
+    br = np.minimum(bboxes_br, candidates_br)
+    area_intersection = np.maximum(0., br - tl).prod(axis=2)
+    area_bboxes = bboxes[:, 2:].prod(axis=1)[:, np.newaxis]
+    area_candidates = candidates[:, 2:].prod(axis=1)[np.newaxis, :]
+    area_union = area_bboxes + area_candidates - area_intersection
+    overlap = area_intersection / area_union
+    if metric == "iou":
+        return overlap
+
+    enclosing_wh = np.maximum(bboxes_br, candidates_br) - np.minimum(
+        bboxes_tl, candidates_tl)
+    if metric == "giou":
+        area_enclosing = enclosing_wh.prod(axis=2)
+        return overlap - (area_enclosing - area_union) / area_enclosing
+    elif metric == "diou":
+        center_distance = np.square(
+            (bboxes_tl + bboxes_br) / 2 - (candidates_tl + candidates_br) / 2
+        ).sum(axis=2)
+        diagonal = np.square(enclosing_wh).sum(axis=2)
+        return overlap - center_distance / diagonal
+    raise ValueError(
+        "Invalid metric; must be either 'iou', 'giou' or 'diou'")
+
+
 def iou_cost(tracks, detections, track_indices=None,
-             detection_indices=None):
+             detection_indices=None, metric="iou"):
     """An intersection over union distance metric.
 
     Parameters
     ----------
     tracks : List[deep_sort.track.Track]
         A list of tracks.
-    detections : List[deep_sort.detection.Detection]
-        A list of detections.
+    detections : deep_sort.detection.DetectionBatch
+        The detections.
     track_indices : Optional[List[int]]
         A list of indices to tracks that should be matched. Defaults to
         all `tracks`.
     detection_indices : Optional[List[int]]
         A list of indices to detections that should be matched. Defaults
         to all `detections`.
+    metric : Optional[str]
+        The overlap measure, see `iou_matrix`. Defaults to plain IoU.
 
     Returns
     -------
@@ -62,6 +119,8 @@ def iou_cost(tracks, detections, track_indices=None,
         Returns a cost matrix of shape
         len(track_indices), len(detection_indices) where entry (i, j) is
         `1 - iou(tracks[track_indices[i]], detections[detection_indices[j]])`.
+        Rows of tracks that have not been updated in the previous frame are
+        set to `linear_assignment.INFTY_COST`.
 
     """
     if track_indices is None:
@@ -69,14 +128,14 @@ def iou_cost(tracks, detections, track_indices=None,
     if detection_indices is None:
         detection_indices = np.arange(len(detections))
 
-    cost_matrix = np.zeros((len(track_indices), len(detection_indices)))
-    for row, track_idx in enumerate(track_indices):
-        if tracks[track_idx].time_since_update > 1:
-            cost_matrix[row, :] = linear_assignment.INFTY_COST
-            continue
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return np.zeros((len(track_indices), len(detection_indices)))
+
+    bboxes = np.asarray([tracks[i].to_tlwh() for i in track_indices])
+    candidates = detections.tlwh[detection_indices]
+    cost_matrix = 1. - iou_matrix(bboxes, candidates, metric)
 
-        bbox = tracks[track_idx].to_tlwh()
-        candidates = np.asarray(
-            [detections[i].tlwh for i in detection_indices])
-        cost_matrix[row, :] = 1. - iou(bbox, candidates)
+    time_since_update = np.asarray(
+        [tracks[i].time_since_update for i in track_indices])
+    cost_matrix[time_since_update > 1, :] = linear_assignment.INFTY_COST
     return cost_matrix
@@ -122,6 +122,47 @@ class KalmanFilter(object):
 
         return mean, covariance
 
+    def multi_predict(self, mean, covariance):
+        """Run Kalman filter prediction step (vectorized version).
+
+        Parameters
+        ----------
+        mean : ndarray
+            The Nx8 dimensional mean matrix of the object states at the
+            previous time step.
+        covariance : ndarray
+            The Nx8x8 dimensional covariance matrices of the object states at
+            the previous time step.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the mean matrix and covariance matrices of the predicted
+            states. Unobserved velocities are initialized to 0 mean.
+
+        """
+        std_pos = [
+            self._std_weight_position * mean[:, 3],
+            self._std_weight_position * mean[:, 3],
+            1e-2 * np.ones_like(mean[:, 3]),
+            self._std_weight_position * mean[:, 3]]
+        std_vel = [
+            self._std_weight_velocity * mean[:, 3],
+            self._std_weight_velocity * mean[:, 3],
+            1e-5 * np.ones_like(mean[:, 3]),
+            self._std_weight_velocity * mean[:, 3]]
+        sqr = np.square(np.r_[std_pos, std_vel]).T
+
+        motion_cov = np.zeros_like(covariance)
+        diag = np.arange(mean.shape[1])
+        motion_cov[:, diag, diag] = sqr
+
+        mean = np.dot(mean, self._motion_mat.T)
+        covariance = np.matmul(np.matmul(
+            self._motion_mat, covariance), self._motion_mat.T) + motion_cov
+
+        return mean, covariance
+
     def project(self, mean, covariance):
         """Project state distribution to measurement space.
 
@@ -151,6 +192,38 @@ class KalmanFilter(object):
             self._update_mat, covariance, self._update_mat.T))
         return mean, covariance + innovation_cov
 
+    def multi_project(self, mean, covariance):
+        """Project state distributions to measurement space (vectorized
+        version).
+
+        Parameters
+        ----------
+        mean : ndarray
+            The states' mean vectors (Nx8 dimensional array).
+        covariance : ndarray
+            The states' covariance matrices (Nx8x8 dimensional).
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the Nx4 projected means and Nx4x4 covariance matrices of
+            the given state estimates.
+
+        """
+        std = [
+            self._std_weight_position * mean[:, 3],
+            self._std_weight_position * mean[:, 3],
+            1e-1 * np.ones_like(mean[:, 3]),
+            self._std_weight_position * mean[:, 3]]
+        sqr = np.square(np.r_[std]).T
+
+        mean = np.dot(mean, self._update_mat.T)
+        covariance = np.matmul(np.matmul(
+            self._update_mat, covariance), self._update_mat.T)
+        diag = np.arange(mean.shape[1])
+        covariance[:, diag, diag] += sqr
+        return mean, covariance
+
     def update(self, mean, covariance, measurement):
         """Run Kalman filter correction step.
 
@@ -185,6 +258,39 @@ class KalmanFilter(object):
             kalman_gain, projected_cov, kalman_gain.T))
         return new_mean, new_covariance
 
+    def multi_update(self, mean, covariance, measurement):
+        """Run Kalman filter correction step (vectorized version).
+
+        Parameters
+        ----------
+        mean : ndarray
+            The predicted states' mean vectors (Nx8 dimensional).
+        covariance : ndarray
+            The states' covariance matrices (Nx8x8 dimensional).
+        measurement : ndarray
+            The Nx4 dimensional measurement matrix, one (x, y, a, h) row per
+            state, where (x, y) is the center position, a the aspect ratio,
+            and h the height of the bounding box.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the measurement-corrected state distributions.
+
+        """
+        projected_mean, projected_cov = self.multi_project(mean, covariance)
+
+        # The innovation covariance is symmetric, hence K = (S^-1 H P)^T.
+        kalman_gain = np.linalg.solve(
+            projected_cov, np.matmul(self._update_mat, covariance))
+        kalman_gain = kalman_gain.transpose(0, 2, 1)
+        innovation = measurement - projected_mean
+
+        new_mean = mean + np.einsum('nij,nj->ni', kalman_gain, innovation)
+        new_covariance = covariance - np.matmul(np.matmul(
+            kalman_gain, projected_cov), kalman_gain.transpose(0, 2, 1))
+        return new_mean, new_covariance
+
     def gating_distance(self, mean, covariance, measurements,
                         only_position=False):
         """Compute gating distance between state distribution and measurements.
@@ -227,3 +333,88 @@ class KalmanFilter(object):
             overwrite_b=True)
         squared_maha = np.sum(z * z, axis=0)
         return squared_maha
+
+    def multi_gating_factors(self, mean, covariance, only_position=False):
+        """Compute the quantities required for gating a set of state
+        distributions, such that they can be reused across gating calls.
+
+        Parameters
+        ----------
+        mean : ndarray
+            Mean vectors of the state distributions (Nx8 dimensional).
+        covariance : ndarray
+            Covariances of the state distributions (Nx8x8 dimensional).
+        only_position : Optional[bool]
+            If True, distance computation is done with respect to the bounding
+            box center position only.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            Returns the projected means (NxK dimensional) and the inverses of
+            the lower Cholesky factors of the projected covariances (NxKxK
+            dimensional), where K is 2 if `only_position` is True and 4
+            otherwise.
+
+        """
+        mean, covariance = self.multi_project(mean, covariance)
+        if only_position:
+            mean, covariance = mean[:, :2], covariance[:, :2, :2]
+
+        cholesky_factor = np.linalg.cholesky(covariance)
+        inverse_factor = np.linalg.inv(cholesky_factor)
+        return mean, inverse_factor
+
+    @staticmethod
+    def factored_gating_distance(factors, measurements):
+        """Compute gating distances from precomputed gating factors.
+
+        Parameters
+        ----------
+        factors : (ndarray, ndarray)
+            Projected means and inverse Cholesky factors as returned by
+            `multi_gating_factors`.
+        measurements : ndarray
+            An Mx4 dimensional matrix of M measurements in format (x, y, a, h).
+
+        Returns
+        -------
+        ndarray
+            Returns an NxM matrix, where element (i, j) contains the squared
+            Mahalanobis distance between the i-th state distribution and
+            `measurements[j]`.
+
+        """
+        mean, inverse_factor = factors
+        d = measurements[np.newaxis, :, :mean.shape[1]] - mean[:, np.newaxis]
+        z = np.matmul(d, inverse_factor.transpose(0, 2, 1))
+        squared_maha = np.sum(z * z, axis=2)
+        return squared_maha
+
+    def multi_gating_distance(self, mean, covariance, measurements,
+                              only_position=False):
+        """Compute gating distance between a set of state distributions and
+        measurements (vectorized version of `gating_distance`).
+
+        Parameters
+        ----------
+        mean : ndarray
+            Mean vectors of the state distributions (Nx8 dimensional).
+        covariance : ndarray
+            Covariances of the state distributions (Nx8x8 dimensional).
+        measurements : ndarray
+            An Mx4 dimensional matrix of M measurements in format (x, y, a, h).
+        only_position : Optional[bool]
+            If True, distance computation is done with respect to the bounding
+            box center position only.
+
+        Returns
+        -------
+        ndarray
+            Returns an NxM matrix, where element (i, j) contains the squared
+            Mahalanobis distance between the i-th state distribution and
+            `measurements[j]`.
+
+        """
+        factors = self.multi_gating_factors(mean, covariance, only_position)
+        return self.factored_gating_distance(factors, measurements)
@@ -1,6 +1,8 @@
 # vim: expandtab:ts=4:sw=4
 from __future__ import absolute_import
 import numpy as np
+import scipy.sparse
+from scipy.sparse.csgraph import connected_components
 # from sklearn.utils.linear_assignment_ import linear_assignment
 from scipy.optimize import linear_sum_assignment as linear_assignment
 from . import kalman_filter
@@ -8,10 +10,252 @@ from . import kalman_filter
 
 INFTY_COST = 1e+5
 
+# Problems with fewer entries are solved directly; decomposing them costs more
+# than it saves.
+MIN_DECOMPOSITION_SIZE = 256
+
+
+def _empty_assignment():
+    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+
+def hungarian_solver(cost_matrix, max_distance):
+    """Exact solver based on `scipy.optimize.linear_sum_assignment`.
+
+    All assignment backends share this interface: they are given the NxM cost
+    matrix, in which all infeasible entries are set to a value just above
+    `max_distance`, and return the row and column indices of the assigned
+    pairs. Returned pairs may include infeasible associations; these are
+    discarded by the caller.
+
+    """
+    return linear_assignment(cost_matrix)
+
+
+def jv_solver(cost_matrix, max_distance):
+    """Exact solver that runs the sparse Jonker-Volgenant algorithm
+    (`scipy.sparse.csgraph.min_weight_full_bipartite_matching`, scipy >= 1.6)
+    on the feasible associations only.
+
+    The problem is extended with one dummy node per row and column such that
+    a full matching always exists. Leaving a row and a column unassigned
+    costs as much as an infeasible association, which yields the same optimum
+    as the dense Hungarian solver.
+
+    """
+    from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+
+    num_rows, num_cols = cost_matrix.shape
+    rows, cols = np.nonzero(cost_matrix <= max_distance)
+    if len(rows) == 0:
+        return _empty_assignment()
+
+    # Weights are offset by one because explicit zeros are dropped from
+    # sparse matrices; perfect matchings all have the same number of edges.
+    unassigned_cost = (max_distance + 1e-5) / 2.
+    row_range, col_range = np.arange(num_rows), np.arange(num_cols)
+    graph_rows = np.r_[rows, row_range, num_rows + col_range, num_rows + cols]
+    graph_cols = np.r_[cols, num_cols + row_range, col_range, num_cols + rows]
+    weights = 1. + np.r_[
+        cost_matrix[rows, cols], np.full(num_rows + num_cols, unassigned_cost),
+        np.zeros(len(rows))]
+    size = num_rows + num_cols
+    graph = scipy.sparse.csr_matrix(
+        (weights, (graph_rows, graph_cols)), shape=(size, size))
+
+    graph_row_indices, graph_col_indices = \
+        min_weight_full_bipartite_matching(graph)
+    assigned = (graph_row_indices < num_rows) & (graph_col_indices < num_cols)
+    order = np.argsort(graph_row_indices[assigned])
+    return (graph_row_indices[assigned][order],
+            graph_col_indices[assigned][order])
+
+
+def greedy_solver(cost_matrix, max_distance):
+    """Approximate solver that repeatedly picks the cheapest feasible
+    association whose row and column are both still free.
+
+    Instead of walking the sorted associations one by one, every round
+    assigns all pairs that are each other's cheapest free option at once.
+    This yields the same assignment when costs are distinct, and the globally
+    cheapest free pair is always among them.
+
+    """
+    cost_matrix = np.where(
+        cost_matrix <= max_distance, cost_matrix, np.inf)
+    row_range = np.arange(cost_matrix.shape[0])
+    row_indices, col_indices = [], []
+    while True:
+        best_cols = np.argmin(cost_matrix, axis=1)
+        best_rows = np.argmin(cost_matrix, axis=0)
+        mutual = (best_rows[best_cols] == row_range) & np.isfinite(
+            cost_matrix[row_range, best_cols])
+        if not np.any(mutual):
+            break
+        rows, cols = row_range[mutual], best_cols[mutual]
+        row_indices.append(rows)
+        col_indices.append(cols)
+        cost_matrix[rows, :] = np.inf
+        cost_matrix[:, cols] = np.inf
+
+    if len(row_indices) == 0:
+        return _empty_assignment()
+    row_indices = np.concatenate(row_indices)
+    col_indices = np.concatenate(col_indices)
+    order = np.argsort(row_indices)
+    return row_indices[order], col_indices[order]
+
+
+def auction_solver(cost_matrix, max_distance, epsilon=1e-3):
+    """Approximate solver based on Bertsekas' auction algorithm.
+
+    Rows bid for columns, raising their price by the bidder's margin over
+    its second best option plus `epsilon`. Every row may also stay
+    unassigned at zero benefit. The result is within `epsilon` per row of the
+    optimal assignment.
+
+    """
+    num_rows, num_cols = cost_matrix.shape
+    rows, cols = np.nonzero(cost_matrix <= max_distance)
+    if len(rows) == 0:
+        return _empty_assignment()
+    benefits = (max_distance + 1e-5) - cost_matrix[rows, cols]
+    row_starts = np.searchsorted(rows, np.arange(num_rows + 1))
+
+    prices = np.zeros(num_cols)
+    owner = np.full(num_cols, -1)
+    unassigned = list(np.unique(rows)[::-1])
+    while unassigned:
+        row = unassigned.pop()
+        start, end = row_starts[row], row_starts[row + 1]
+        candidates = cols[start:end]
+        values = benefits[start:end] - prices[candidates]
+
+        best = np.argmax(values)
+        best_value = values[best]
+        if best_value <= 0.:
+            continue  # Staying unassigned is at least as good.
+        values[best] = 0.
+        second_value = max(values.max(), 0.) if len(values) > 1 else 0.
+
+        col = candidates[best]
+        prices[col] += best_value - second_value + epsilon
+        if owner[col] >= 0:
+            unassigned.append(owner[col])
+        owner[col] = row
+
+    col_indices = np.flatnonzero(owner >= 0)
+    row_indices = owner[col_indices]
+    order = np.argsort(row_indices)
+    return row_indices[order], col_indices[order]
+
+
+ASSIGNMENT_BACKENDS = {
+    "hungarian": hungarian_solver,
+    "jv": jv_solver,
+    "greedy": greedy_solver,
+    "auction": auction_solver,
+}
+
+
+def split_components(cost_matrix, max_distance):
+    """Partition an assignment problem into independent subproblems.
+
+    Rows and columns are nodes of a bipartite graph with an edge for every
+    feasible association (cost not larger than `max_distance`). Since all
+    infeasible associations share the same cost, an optimal assignment of the
+    full problem is obtained by solving every connected component of this
+    graph on its own.
+
+    Parameters
+    ----------
+    cost_matrix : ndarray
+        The NxM dimensional cost matrix.
+    max_distance : float
+        Gating threshold. Associations with cost larger than this value are
+        infeasible.
+
+    Returns
+    -------
+    List[(ndarray, ndarray)]
+        Returns the row and column indices of every connected component that
+        contains at least one feasible association.
+
+    """
+    num_rows, num_cols = cost_matrix.shape
+    rows, cols = np.nonzero(cost_matrix <= max_distance)
+    if len(rows) == 0:
+        return []
+    graph = scipy.sparse.coo_matrix(
+        (np.ones(len(rows)), (rows, num_rows + cols)),
+        shape=(num_rows + num_cols, num_rows + num_cols))
+    _, labels = connected_components(graph, directed=False)
+    row_labels, col_labels = labels[:num_rows], labels[num_rows:]
+
+    def group(node_labels, component_labels):
+        order = np.argsort(node_labels, kind="stable")
+        sorted_labels = node_labels[order]
+        starts = np.searchsorted(sorted_labels, component_labels, "left")
+        ends = np.searchsorted(sorted_labels, component_labels, "right")
+        return [order[s:e] for s, e in zip(starts, ends)]
+
+    component_labels = np.unique(row_labels[rows])
+    return list(zip(group(row_labels, component_labels),
+                    group(col_labels, component_labels)))
+
+
+def solve_assignment(cost_matrix, max_distance, executor=None,
+                     solver=hungarian_solver):
+    """Solve a linear assignment problem by solving the connected components
+    of its feasible associations independently.
+
+    Parameters
+    ----------
+    cost_matrix : ndarray
+        The NxM dimensional cost matrix. Entries larger than `max_distance`
+        must all be equal.
+    max_distance : float
+        Gating threshold. Associations with cost larger than this value are
+        infeasible.
+    executor : Optional[concurrent.futures.Executor]
+        If not None, components are solved concurrently on this executor.
+    solver : Optional[Callable[ndarray, float] -> (ndarray, ndarray)]
+        Assignment backend used to solve every component (see
+        `ASSIGNMENT_BACKENDS`). Defaults to the Hungarian solver.
+
+    Returns
+    -------
+    (ndarray, ndarray)
+        Returns the row and column indices of the assignment, sorted by row.
+        Rows and columns without a feasible association are left unassigned.
+
+    """
+    if cost_matrix.size < MIN_DECOMPOSITION_SIZE:
+        return solver(cost_matrix, max_distance)
+
+    components = split_components(cost_matrix, max_distance)
+    if len(components) == 0:
+        return _empty_assignment()
+
+    def solve(component):
+        rows, cols = component
+        row_indices, col_indices = solver(
+            cost_matrix[np.ix_(rows, cols)], max_distance)
+        return rows[row_indices], cols[col_indices]
+
+    if executor is not None and len(components) > 1:
+        solutions = list(executor.map(solve, components))
+    else:
+        solutions = [solve(component) for component in components]
+    row_indices = np.concatenate([rows for rows, _ in solutions])
+    col_indices = np.concatenate([cols for _, cols in solutions])
+    order = np.argsort(row_indices)
+    return row_indices[order], col_indices[order]
+
 
 def min_cost_matching(
         distance_metric, max_distance, tracks, detections, track_indices=None,
-        detection_indices=None):
+        detection_indices=None, executor=None, solver=hungarian_solver):
     """Solve linear assignment problem.
 
     Parameters
@@ -35,6 +279,12 @@ def min_cost_matching(
     detection_indices : List[int]
         List of detection indices that maps columns in `cost_matrix` to
         detections in `detections` (see description above).
+    executor : Optional[concurrent.futures.Executor]
+        If not None, independent subproblems are solved concurrently on this
+        executor (see `solve_assignment`).
+    solver : Optional[Callable[ndarray, float] -> (ndarray, ndarray)]
+        Assignment backend (see `ASSIGNMENT_BACKENDS`). Defaults to the
+        Hungarian solver.
 
     Returns
     -------
@@ -57,31 +307,35 @@ def min_cost_matching(
         tracks, detections, track_indices, detection_indices)
     cost_matrix[cost_matrix > max_distance] = max_distance + 1e-5
 
-    row_indices, col_indices = linear_assignment(cost_matrix)
-
-    matches, unmatched_tracks, unmatched_detections = [], [], []
-    for col, detection_idx in enumerate(detection_indices):
-        if col not in col_indices:
-            unmatched_detections.append(detection_idx)
-    for row, track_idx in enumerate(track_indices):
-        if row not in row_indices:
-            unmatched_tracks.append(track_idx)
-    for row, col in zip(row_indices, col_indices):
-        track_idx = track_indices[row]
-        detection_idx = detection_indices[col]
-        if cost_matrix[row, col] > max_distance:
-            unmatched_tracks.append(track_idx)
-            unmatched_detections.append(detection_idx)
-        else:
-            matches.append((track_idx, detection_idx))
+    row_indices, col_indices = solve_assignment(
+        cost_matrix, max_distance, executor, solver)
+
+    # Drop infeasible pairs, then mark everything left over as unmatched.
+    feasible = cost_matrix[row_indices, col_indices] <= max_distance
+    row_indices, col_indices = row_indices[feasible], col_indices[feasible]
+    row_matched = np.zeros(len(track_indices), dtype=bool)
+    col_matched = np.zeros(len(detection_indices), dtype=bool)
+    row_matched[row_indices] = True
+    col_matched[col_indices] = True
+
+    matches = [(track_indices[row], detection_indices[col])
+               for row, col in zip(row_indices, col_indices)]
+    unmatched_tracks = [
+        track_indices[row] for row in np.flatnonzero(~row_matched)]
+    unmatched_detections = [
+        detection_indices[col] for col in np.flatnonzero(~col_matched)]
     return matches, unmatched_tracks, unmatched_detections
 
 
 def matching_cascade(
         distance_metric, max_distance, cascade_depth, tracks, detections,
-        track_indices=None, detection_indices=None):
+        track_indices=None, detection_indices=None, executor=None,
+        solver=hungarian_solver):
     """Run matching cascade.
 
+    The cost matrix between all given tracks and detections is computed once
+    and every cascade level is solved on a row/column slice of it.
+
     Parameters
     ----------
     distance_metric : Callable[List[Track], List[Detection], List[int], List[int]) -> ndarray
@@ -106,6 +360,12 @@ def matching_cascade(
         List of detection indices that maps columns in `cost_matrix` to
         detections in `detections` (see description above). Defaults to all
         detections.
+    executor : Optional[concurrent.futures.Executor]
+        If not None, independent subproblems are solved concurrently on this
+        executor (see `solve_assignment`).
+    solver : Optional[Callable[ndarray, float] -> (ndarray, ndarray)]
+        Assignment backend (see `ASSIGNMENT_BACKENDS`). Defaults to the
+        Hungarian solver.
 
     Returns
     -------
@@ -123,21 +383,39 @@ def matching_cascade(
 
     unmatched_detections = detection_indices
     matches = []
-    for level in range(cascade_depth):
+
+    # Group tracks into levels by time since update with a single sort.
+    time_since_update = np.asarray(
+        [tracks[k].time_since_update for k in track_indices], dtype=np.int64)
+    order = np.argsort(time_since_update, kind="stable")
+    levels, level_starts = np.unique(
+        time_since_update[order], return_index=True)
+    level_ends = np.r_[level_starts[1:], len(order)]
+    in_cascade = (levels >= 1) & (levels <= cascade_depth)
+
+    if np.any(in_cascade) and len(detection_indices) > 0:
+        cost_matrix = distance_metric(
+            tracks, detections, track_indices, detection_indices)
+        column_lookup = np.full(np.max(detection_indices) + 1, -1)
+        column_lookup[np.asarray(detection_indices)] = np.arange(
+            len(detection_indices))
+
+    for start, end in zip(level_starts[in_cascade], level_ends[in_cascade]):
         if len(unmatched_detections) == 0:  # No detections left
             break
 
-        track_indices_l = [
-            k for k in track_indices
-            if tracks[k].time_since_update == 1 + level
-        ]
-        if len(track_indices_l) == 0:  # Nothing to match at this level
-            continue
+        rows = order[start:end]
+        track_indices_l = [track_indices[row] for row in rows]
+
+        def level_metric(tracks, detections, track_indices, detection_indices,
+                         rows=rows):
+            columns = column_lookup[np.asarray(detection_indices)]
+            return cost_matrix[np.ix_(rows, columns)]
 
         matches_l, _, unmatched_detections = \
             min_cost_matching(
-                distance_metric, max_distance, tracks, detections,
-                track_indices_l, unmatched_detections)
+                level_metric, max_distance, tracks, detections,
+                track_indices_l, unmatched_detections, executor, solver)
         matches += matches_l
     unmatched_tracks = list(set(track_indices) - set(k for k, _ in matches))
     return matches, unmatched_tracks, unmatched_detections
@@ -159,8 +437,8 @@ def gate_cost_matrix(
         `detections[detection_indices[j]]`.
     tracks : List[track.Track]
         A list of predicted tracks at the current time step.
-    detections : List[detection.Detection]
-        A list of detections at the current time step.
+    detections : detection.DetectionBatch
+        The detections at the current time step.
     track_indices : List[int]
         List of track indices that maps rows in `cost_matrix` to tracks in
         `tracks` (see description above).
@@ -180,13 +458,66 @@ def gate_cost_matrix(
         Returns the modified cost matrix.
 
     """
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return cost_matrix
+
+    feasible = gate_mask(
+        kf, tracks, detections, track_indices, detection_indices,
+        only_position)
+    cost_matrix[~feasible] = gated_cost
+    return cost_matrix
+
+
+def gate_mask(
+        kf, tracks, detections, track_indices, detection_indices,
+        only_position=False):
+    """Find the associations that are feasible according to the state
+    distributions obtained by Kalman filtering.
+
+    Parameters
+    ----------
+    kf : The Kalman filter.
+    tracks : List[track.Track]
+        A list of predicted tracks at the current time step.
+    detections : detection.DetectionBatch
+        The detections at the current time step.
+    track_indices : List[int]
+        List of N track indices into `tracks`.
+    detection_indices : List[int]
+        List of M detection indices into `detections`.
+    only_position : Optional[bool]
+        If True, only the x, y position of the state distribution is considered
+        during gating. Defaults to False.
+
+    Returns
+    -------
+    ndarray
+        Returns a boolean NxM matrix where element (i, j) is True if
+        `detections[detection_indices[j]]` lies inside the gate of
+        `tracks[track_indices[i]]`.
+
+    """
+    if len(track_indices) == 0 or len(detection_indices) == 0:
+        return np.zeros((len(track_indices), len(detection_indices)), bool)
+
     gating_dim = 2 if only_position else 4
     gating_threshold = kalman_filter.chi2inv95[gating_dim]
-    measurements = np.asarray(
-        [detections[i].to_xyah() for i in detection_indices])
-    for row, track_idx in enumerate(track_indices):
-        track = tracks[track_idx]
-        gating_distance = kf.gating_distance(
-            track.mean, track.covariance, measurements, only_position)
-        cost_matrix[row, gating_distance > gating_threshold] = gated_cost
-    return cost_matrix
+    measurements = detections.to_xyah()[detection_indices]
+    factors = _gating_factors(kf, tracks, track_indices, only_position)
+    gating_distance = kf.factored_gating_distance(factors, measurements)
+    return gating_distance <= gating_threshold
+
+
+def _gating_factors(kf, tracks, track_indices, only_position):
+    """Collect the gating factors of the given tracks, reusing the per-frame
+    cache of their state store when they share one.
+    """
+    store = tracks[track_indices[0]].store
+    if all(tracks[i].store is store for i in track_indices):
+        slots = [tracks[i].slot for i in track_indices]
+        mean, inverse_factor = store.gating_factors(kf, only_position)
+        return mean[slots], inverse_factor[slots]
+
+    mean = np.asarray([tracks[i].mean for i in track_indices])
+    covariance = np.asarray([tracks[i].covariance for i in track_indices])
+    return kf.multi_gating_factors(mean, covariance, only_position)
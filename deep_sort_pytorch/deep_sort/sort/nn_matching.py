@@ -101,6 +101,12 @@ class NearestNeighborDistanceMetric(object):
     A nearest neighbor distance metric that, for each target, returns
     the closest distance to any sample that has been observed so far.
 
+    Samples are kept in a single preallocated gallery of shape
+    (max_targets, budget, feature_dim). Every target owns one row of the
+    gallery that is used as a ring buffer, such that insertion takes constant
+    time and `distance` reduces to one matrix product over all requested
+    targets.
+
     Parameters
     ----------
     metric : str
@@ -111,27 +117,103 @@ class NearestNeighborDistanceMetric(object):
     budget : Optional[int]
         If not None, fix samples per class to at most this number. Removes
         the oldest samples when the budget is reached.
+    capacity : Optional[int]
+        Initial number of targets the gallery has room for. The gallery grows
+        automatically.
 
     Attributes
     ----------
-    samples : Dict[int -> List[ndarray]]
-        A dictionary that maps from target identities to the list of samples
-        that have been observed so far.
+    samples : Dict[int -> ndarray]
+        A dictionary that maps from target identities to the samples that
+        have been observed so far (oldest first). For the cosine metric the
+        samples are stored normalized to unit length.
 
     """
 
-    def __init__(self, metric, matching_threshold, budget=None):
+    def __init__(self, metric, matching_threshold, budget=None, capacity=64):
 
         if metric == "euclidean":
-            self._metric = _nn_euclidean_distance
+            self._normalize = False
         elif metric == "cosine":
-            self._metric = _nn_cosine_distance
+            self._normalize = True
         else:
             raise ValueError(
                 "Invalid metric; must be either 'euclidean' or 'cosine'")
         self.matching_threshold = matching_threshold
         self.budget = budget
-        self.samples = {}
+
+        self._gallery = None
+        self._sq_norms = None
+        self._heads = np.zeros(capacity, dtype=np.int64)
+        self._counts = np.zeros(capacity, dtype=np.int64)
+        self._slots = {}
+        self._free = list(range(capacity - 1, -1, -1))
+        self._scratch_buffers = {}
+
+    @property
+    def samples(self):
+        samples = {}
+        for target, slot in self._slots.items():
+            count, head = self._counts[slot], self._heads[slot]
+            order = (head - count + np.arange(count)) % self._gallery.shape[1]
+            samples[target] = self._gallery[slot, order]
+        return samples
+
+    def _reserve(self, feature_dim, sample_capacity):
+        """Make sure the gallery holds at least `sample_capacity` samples of
+        dimensionality `feature_dim` per target."""
+        capacity = len(self._counts)
+        if self._gallery is None:
+            if self.budget is not None:
+                size = self.budget
+            else:
+                size = max(16, sample_capacity)
+            self._gallery = np.zeros(
+                (capacity, size, feature_dim), dtype=np.float32)
+            self._sq_norms = np.zeros(self._gallery.shape[:2], np.float32)
+        elif self.budget is None and sample_capacity > self._gallery.shape[1]:
+            # Without budget ring buffers only wrap when exactly full, hence
+            # samples are stored in order and heads equal counts.
+            size = max(2 * self._gallery.shape[1], sample_capacity)
+            gallery = np.zeros((capacity, size, feature_dim), np.float32)
+            gallery[:, :self._gallery.shape[1]] = self._gallery
+            sq_norms = np.zeros((capacity, size), np.float32)
+            sq_norms[:, :self._sq_norms.shape[1]] = self._sq_norms
+            self._gallery, self._sq_norms = gallery, sq_norms
+            self._heads[:] = self._counts
+
+    def _grow(self):
+        old_capacity = len(self._counts)
+        new_capacity = 2 * old_capacity
+        self._heads = np.r_[self._heads, np.zeros_like(self._heads)]
+        self._counts = np.r_[self._counts, np.zeros_like(self._counts)]
+        if self._gallery is not None:
+            self._gallery = np.concatenate(
+                (self._gallery, np.zeros_like(self._gallery)))
+            self._sq_norms = np.concatenate(
+                (self._sq_norms, np.zeros_like(self._sq_norms)))
+        self._free = list(range(new_capacity - 1, old_capacity - 1, -1))
+
+    def _scratch(self, name, shape, dtype):
+        """A buffer of the given shape for `distance`, reused between calls
+        and only reallocated when it has to grow."""
+        size = int(np.prod(shape))
+        buffer = self._scratch_buffers.get(name)
+        if buffer is None or len(buffer) < size:
+            buffer = np.empty(size, dtype)
+            self._scratch_buffers[name] = buffer
+        return buffer[:size].reshape(shape)
+
+    def _slot(self, target):
+        slot = self._slots.get(target)
+        if slot is None:
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self._heads[slot] = 0
+            self._counts[slot] = 0
+            self._slots[target] = slot
+        return slot
 
     def partial_fit(self, features, targets, active_targets):
         """Update the distance metric with new data.
@@ -146,11 +228,47 @@ class NearestNeighborDistanceMetric(object):
             A list of targets that are currently present in the scene.
 
         """
-        for feature, target in zip(features, targets):
-            self.samples.setdefault(target, []).append(feature)
-            if self.budget is not None:
-                self.samples[target] = self.samples[target][-self.budget:]
-        self.samples = {k: self.samples[k] for k in active_targets}
+        active_targets = set(active_targets)
+        for target in [k for k in self._slots if k not in active_targets]:
+            self._free.append(self._slots.pop(target))
+
+        targets = np.asarray(targets)
+        if len(targets) == 0:
+            return
+        features = np.asarray(features, dtype=np.float32)
+        keep = np.isin(targets, list(active_targets))
+        features, targets = features[keep], targets[keep]
+        if len(targets) == 0:
+            return
+
+        unique_targets, inverse = np.unique(targets, return_inverse=True)
+        unique_slots = np.array([self._slot(k) for k in unique_targets])
+        slots = unique_slots[inverse]
+
+        # Rank of every feature among the new features of its target.
+        order = np.argsort(slots, kind="stable")
+        slots, features = slots[order], features[order]
+        unique_slots, first, counts = np.unique(
+            slots, return_index=True, return_counts=True)
+        rank = np.arange(len(slots)) - np.repeat(first, counts)
+
+        self._reserve(
+            features.shape[1], int(np.max(self._counts[unique_slots] + counts)))
+        size = self._gallery.shape[1]
+        if self.budget is not None:
+            # Only the newest `budget` features of each target survive.
+            keep = rank >= np.repeat(counts, counts) - size
+            slots, features, rank = slots[keep], features[keep], rank[keep]
+
+        if self._normalize:
+            features = features / np.linalg.norm(
+                features, axis=1, keepdims=True)
+        positions = (self._heads[slots] + rank) % size
+        self._gallery[slots, positions] = features
+        self._sq_norms[slots, positions] = np.square(features).sum(axis=1)
+        self._heads[unique_slots] = (self._heads[unique_slots] + counts) % size
+        self._counts[unique_slots] = np.minimum(
+            self._counts[unique_slots] + counts, size)
 
     def distance(self, features, targets):
         """Compute distance between features and targets.
@@ -167,10 +285,54 @@ class NearestNeighborDistanceMetric(object):
         ndarray
             Returns a cost matrix of shape len(targets), len(features), where
             element (i, j) contains the closest squared distance between
-            `targets[i]` and `features[j]`.
+            `targets[i]` and `features[j]`. Targets without any samples have
+            infinite distance.
 
         """
         cost_matrix = np.zeros((len(targets), len(features)))
-        for i, target in enumerate(targets):
-            cost_matrix[i, :] = self._metric(self.samples[target], features)
+        if len(targets) == 0 or len(features) == 0:
+            return cost_matrix
+        if self._gallery is None:
+            cost_matrix[:] = np.inf
+            return cost_matrix
+
+        features = np.asarray(features, dtype=np.float32)
+        if self._normalize:
+            features = features / np.linalg.norm(
+                features, axis=1, keepdims=True)
+
+        # Unknown targets map to an empty slot past the end of the gallery.
+        num_slots = len(self._counts)
+        slots = np.array([self._slots.get(k, num_slots) for k in targets])
+        known = slots < num_slots
+        slots[~known] = 0
+        num_samples, feature_dim = self._gallery.shape[1:]
+
+        # Gather the samples of the requested targets and compare them with
+        # all features in one matrix product, in buffers reused per frame.
+        gallery = self._scratch(
+            "gallery", (len(slots), num_samples, feature_dim), np.float32)
+        np.take(self._gallery, slots, axis=0, out=gallery, mode="clip")
+        distances = self._scratch(
+            "distances", (len(slots) * num_samples, len(features)), np.float32)
+        np.dot(gallery.reshape(-1, feature_dim), features.T, out=distances)
+        distances = distances.reshape(len(slots), num_samples, len(features))
+        if self._normalize:
+            np.subtract(1., distances, out=distances)
+        else:
+            sq_norms = self._scratch(
+                "sq_norms", (len(slots), num_samples), np.float32)
+            np.take(
+                self._sq_norms, slots, axis=0, out=sq_norms, mode="clip")
+            distances *= -2.
+            distances += sq_norms[:, :, np.newaxis]
+            distances += np.square(features).sum(axis=1)
+            np.maximum(distances, 0., out=distances)
+
+        counts = np.where(known, self._counts[slots], 0)
+        invalid = self._scratch("invalid", (len(slots), num_samples), bool)
+        np.greater_equal(
+            np.arange(num_samples), counts[:, np.newaxis], out=invalid)
+        np.copyto(distances, np.inf, where=invalid[:, :, np.newaxis])
+        distances.min(axis=1, out=cost_matrix)
         return cost_matrix
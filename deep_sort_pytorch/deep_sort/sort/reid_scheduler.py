@@ -0,0 +1,88 @@
+# vim: expandtab:ts=4:sw=4
+import numpy as np
+from .iou_matching import iou_matrix
+
+
+class ReIDScheduler(object):
+    """
+    Decides for which detections the appearance feature must be computed.
+
+    A detection is unambiguous if it overlaps exactly one predicted track,
+    that track overlaps no other detection, the detection overlaps no other
+    detection, and its IoU with the prediction is at least `min_iou`. If
+    the track is confirmed, was updated in the previous frame and its last
+    embedding is younger than `refresh_interval` frames, the detection
+    reuses that embedding instead of running the feature extractor.
+
+    Parameters
+    ----------
+    refresh_interval : int
+        An embedding is reused for at most `refresh_interval - 1` frames
+        after it has been computed. Values smaller than 2 disable reuse.
+    min_iou : float
+        Minimum IoU between the detection and the predicted track box.
+
+    Attributes
+    ----------
+    num_reused : int
+        Number of detections that reused a track embedding so far.
+    num_extracted : int
+        Number of detections that required feature extraction so far.
+
+    """
+
+    def __init__(self, refresh_interval=5, min_iou=0.7):
+        self.refresh_interval = refresh_interval
+        self.min_iou = min_iou
+        self.num_reused = 0
+        self.num_extracted = 0
+
+    @property
+    def skip_ratio(self):
+        """Fraction of detections for which feature extraction was skipped.
+        """
+        total = self.num_reused + self.num_extracted
+        return self.num_reused / total if total > 0 else 0.
+
+    def select(self, tracks, boxes):
+        """Find the detections that can reuse a track embedding.
+
+        Parameters
+        ----------
+        tracks : List[track.Track]
+            The predicted tracks at the current time step.
+        boxes : ndarray
+            An Nx4 matrix of detection boxes in format `(top left x,
+            top left y, width, height)`.
+
+        Returns
+        -------
+        ndarray
+            Returns for every detection the index of the track whose embedding
+            it reuses, or -1 if the feature must be extracted.
+
+        """
+        reuse = np.full(len(boxes), -1, dtype=np.int64)
+        if self.refresh_interval > 1 and len(tracks) > 0 and len(boxes) > 0:
+            track_boxes = np.asarray([t.to_tlwh() for t in tracks])
+            overlap = iou_matrix(track_boxes, boxes)
+            overlapping = overlap > 0
+            detection_overlaps = (iou_matrix(boxes, boxes) > 0).sum(axis=1)
+            eligible = np.array([
+                t.is_confirmed() and t.time_since_update == 1 and
+                t.last_feature is not None and
+                t.feature_age < self.refresh_interval - 1 for t in tracks])
+
+            columns = np.arange(len(boxes))
+            best = np.argmax(overlap, axis=0)
+            unambiguous = (
+                (overlapping.sum(axis=0) == 1) &
+                (overlapping.sum(axis=1)[best] == 1) &
+                (detection_overlaps == 1) &
+                (overlap[best, columns] >= self.min_iou) & eligible[best])
+            reuse[unambiguous] = best[unambiguous]
+
+        num_reused = int(np.sum(reuse >= 0))
+        self.num_reused += num_reused
+        self.num_extracted += len(boxes) - num_reused
+        return reuse
@@ -0,0 +1,176 @@
+# vim: expandtab:ts=4:sw=4
+import numpy as np
+
+
+class StateStore(object):
+    """
+    Contiguous storage for the Kalman filter state of a set of tracks.
+
+    The means and covariances of all tracks live in two preallocated arrays
+    (struct-of-arrays layout), such that the whole track set can be predicted
+    and updated with a single vectorized Kalman filter call. Each track owns
+    one slot (row) of the store; slots of deleted tracks are recycled.
+
+    The store also caches the gating factors (projected means and inverse
+    Cholesky factors) of all active slots. The cache is invalidated whenever
+    the state distributions change through the store, such that within one
+    frame the factors are computed once and shared by all gating calls.
+
+    Parameters
+    ----------
+    capacity : int
+        Initial number of slots. The store grows automatically.
+    ndim : int
+        Dimensionality of the state space.
+
+    Attributes
+    ----------
+    mean : ndarray
+        A capacity x ndim matrix of state means.
+    covariance : ndarray
+        A capacity x ndim x ndim array of state covariances.
+
+    """
+
+    def __init__(self, capacity=64, ndim=8):
+        self.mean = np.zeros((capacity, ndim))
+        self.covariance = np.zeros((capacity, ndim, ndim))
+        self._active = np.zeros(capacity, dtype=bool)
+        self._free = list(range(capacity - 1, -1, -1))
+        self._gating_cache = {}
+
+    def __len__(self):
+        return int(self._active.sum())
+
+    @property
+    def capacity(self):
+        return len(self._active)
+
+    @property
+    def active_slots(self):
+        """Returns the indices of all slots that are currently in use."""
+        return np.flatnonzero(self._active)
+
+    def _grow(self):
+        old_capacity = self.capacity
+        new_capacity = 2 * old_capacity
+        ndim = self.mean.shape[1]
+
+        mean = np.zeros((new_capacity, ndim))
+        mean[:old_capacity] = self.mean
+        covariance = np.zeros((new_capacity, ndim, ndim))
+        covariance[:old_capacity] = self.covariance
+        active = np.zeros(new_capacity, dtype=bool)
+        active[:old_capacity] = self._active
+
+        self.mean, self.covariance, self._active = mean, covariance, active
+        self._free = list(range(new_capacity - 1, old_capacity - 1, -1))
+
+    def allocate(self, mean, covariance):
+        """Reserve a slot and initialize it with the given distribution.
+
+        Parameters
+        ----------
+        mean : ndarray
+            The 8 dimensional mean vector.
+        covariance : ndarray
+            The 8x8 dimensional covariance matrix.
+
+        Returns
+        -------
+        int
+            The slot index.
+
+        """
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self.mean[slot] = mean
+        self.covariance[slot] = covariance
+        self._active[slot] = True
+        self.invalidate()
+        return slot
+
+    def release(self, slot):
+        """Return a slot to the store so that it can be reused."""
+        if self._active[slot]:
+            self._active[slot] = False
+            self._free.append(slot)
+
+    def predict(self, kf, slots=None):
+        """Run a vectorized Kalman filter prediction step.
+
+        Parameters
+        ----------
+        kf : kalman_filter.KalmanFilter
+            The Kalman filter.
+        slots : Optional[array_like]
+            The slots to propagate. Defaults to all active slots.
+
+        """
+        if slots is None:
+            slots = self.active_slots
+        if len(slots) == 0:
+            return
+        self.mean[slots], self.covariance[slots] = kf.multi_predict(
+            self.mean[slots], self.covariance[slots])
+        self.invalidate()
+
+    def update(self, kf, slots, measurements):
+        """Run a vectorized Kalman filter correction step.
+
+        Parameters
+        ----------
+        kf : kalman_filter.KalmanFilter
+            The Kalman filter.
+        slots : array_like
+            The slots to correct.
+        measurements : ndarray
+            An Nx4 matrix of measurements in format (x, y, a, h), one row per
+            entry in `slots`.
+
+        """
+        if len(slots) == 0:
+            return
+        self.mean[slots], self.covariance[slots] = kf.multi_update(
+            self.mean[slots], self.covariance[slots], measurements)
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop cached gating factors. Must be called after the state
+        distributions have been modified from outside the store."""
+        self._gating_cache.clear()
+
+    def gating_factors(self, kf, only_position=False):
+        """Get the gating factors of all slots, computing them for the active
+        slots if they are not cached.
+
+        Parameters
+        ----------
+        kf : kalman_filter.KalmanFilter
+            The Kalman filter.
+        only_position : Optional[bool]
+            If True, the factors are computed with respect to the bounding box
+            center position only.
+
+        Returns
+        -------
+        (ndarray, ndarray)
+            The projected means (capacity x K) and inverse Cholesky factors
+            (capacity x K x K) as returned by
+            `KalmanFilter.multi_gating_factors`. Rows of inactive slots are
+            undefined.
+
+        """
+        factors = self._gating_cache.get(only_position)
+        if factors is None:
+            slots = self.active_slots
+            k = 2 if only_position else 4
+            mean = np.zeros((self.capacity, k))
+            inverse_factor = np.zeros((self.capacity, k, k))
+            if len(slots) > 0:
+                mean[slots], inverse_factor[slots] = kf.multi_gating_factors(
+                    self.mean[slots], self.covariance[slots], only_position)
+            factors = mean, inverse_factor
+            self._gating_cache[only_position] = factors
+        return factors
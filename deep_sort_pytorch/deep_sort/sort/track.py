@@ -1,4 +1,5 @@
 # vim: expandtab:ts=4:sw=4
+from .state_store import StateStore
 
 
 class TrackState:
@@ -40,13 +41,21 @@ class Track:
     feature : Optional[ndarray]
         Feature vector of the detection this track originates from. If not None,
         this feature is added to the `features` cache.
+    store : Optional[state_store.StateStore]
+        The store that holds the state distribution of this track. If None, a
+        private single-track store is created.
 
     Attributes
     ----------
     mean : ndarray
-        Mean vector of the initial state distribution.
+        Mean vector of the current state distribution (a view into `store`).
     covariance : ndarray
-        Covariance matrix of the initial state distribution.
+        Covariance matrix of the current state distribution (a view into
+        `store`).
+    store : state_store.StateStore
+        The store that holds the state distribution of this track.
+    slot : int
+        Index of this track's state distribution in `store`.
     track_id : int
         A unique track identifier.
     hits : int
@@ -60,26 +69,72 @@ class Track:
     features : List[ndarray]
         A cache of features. On each measurement update, the associated feature
         vector is added to this list.
+    last_feature : ndarray | NoneType
+        The most recently computed feature vector of this track.
+    feature_age : int
+        Number of measurement updates since `last_feature` was computed.
+    confidence : float
+        Detector confidence of the last associated detection.
+    class_id : int
+        Detector class label of the last associated detection.
 
     """
 
+    __slots__ = (
+        "store", "slot", "track_id", "hits", "age", "time_since_update",
+        "state", "features", "last_feature", "feature_age", "confidence",
+        "class_id", "_n_init", "_max_age")
+
     def __init__(self, mean, covariance, track_id, n_init, max_age,
-                 feature=None):
-        self.mean = mean
-        self.covariance = covariance
+                 feature=None, store=None):
+        if store is None:
+            store = StateStore(capacity=1, ndim=len(mean))
+        self.store = store
+        self.features = []
+        self.reset(mean, covariance, track_id, n_init, max_age, feature)
+
+    def reset(self, mean, covariance, track_id, n_init, max_age,
+              feature=None):
+        """Re-initialize this track in place, allocating a new slot in its
+        store. Used by `TrackPool` to recycle the objects of deleted tracks;
+        the arguments are the same as for the constructor.
+        """
+        self.slot = self.store.allocate(mean, covariance)
         self.track_id = track_id
         self.hits = 1
         self.age = 1
         self.time_since_update = 0
 
         self.state = TrackState.Tentative
-        self.features = []
+        del self.features[:]
         if feature is not None:
             self.features.append(feature)
+        self.last_feature = feature
+        self.feature_age = 0
+        self.confidence = 0.
+        self.class_id = -1
 
         self._n_init = n_init
         self._max_age = max_age
 
+    @property
+    def mean(self):
+        return self.store.mean[self.slot]
+
+    @mean.setter
+    def mean(self, value):
+        self.store.mean[self.slot] = value
+        self.store.invalidate()
+
+    @property
+    def covariance(self):
+        return self.store.covariance[self.slot]
+
+    @covariance.setter
+    def covariance(self, value):
+        self.store.covariance[self.slot] = value
+        self.store.invalidate()
+
     def to_tlwh(self):
         """Get current position in bounding box format `(top left x, top left y,
         width, height)`.
@@ -140,13 +195,42 @@ class Track:
         """
         self.mean, self.covariance = kf.update(
             self.mean, self.covariance, detection.to_xyah())
-        self.features.append(detection.feature)
+        self.mark_hit(detection.feature, detection.reused_feature)
+
+    def mark_hit(self, feature, reused_feature=False):
+        """Update the feature cache and track state after the state
+        distribution has been corrected with an associated detection (e.g.,
+        by a batched update of the store). Reused and missing features are
+        not added to the cache.
+
+        Parameters
+        ----------
+        feature : ndarray | NoneType
+            Feature vector of the associated detection.
+        reused_feature : Optional[bool]
+            True if `feature` is a reused track embedding.
+
+        """
+        if reused_feature:
+            self.feature_age += 1
+        elif feature is not None:
+            self.features.append(feature)
+            self.last_feature = feature
+            self.feature_age = 0
 
         self.hits += 1
         self.time_since_update = 0
         if self.state == TrackState.Tentative and self.hits >= self._n_init:
             self.state = TrackState.Confirmed
 
+    def needs_feature(self):
+        """Returns True if the feature of the next associated detection is
+        used, i.e., if this track is confirmed or the next hit confirms it.
+        """
+        return (self.state == TrackState.Confirmed or
+                self.state == TrackState.Tentative and
+                self.hits + 1 >= self._n_init)
+
     def mark_missed(self):
         """Mark this track as missed (no association at the current time step).
         """
@@ -167,3 +251,63 @@ class Track:
     def is_deleted(self):
         """Returns True if this track is dead and should be deleted."""
         return self.state == TrackState.Deleted
+
+
+class TrackPool:
+    """
+    A free list of `Track` objects that share one state store.
+
+    Deleted tracks are handed back to the pool, which releases their store
+    slot and keeps the object (including its feature list) for the next new
+    track. In steady state, track churn therefore does not allocate any new
+    objects or arrays.
+
+    Parameters
+    ----------
+    store : state_store.StateStore
+        The store that holds the state distributions of all pooled tracks.
+
+    Attributes
+    ----------
+    store : state_store.StateStore
+        The store that holds the state distributions of all pooled tracks.
+    num_created : int
+        Number of `Track` objects allocated by this pool so far.
+    num_reused : int
+        Number of tracks that were served from recycled objects so far.
+
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.num_created = 0
+        self.num_reused = 0
+        self._free = []
+
+    def __len__(self):
+        """Returns the number of idle track objects."""
+        return len(self._free)
+
+    def acquire(self, mean, covariance, track_id, n_init, max_age,
+                feature=None):
+        """Get an initialized track, recycling an idle object if possible.
+        The arguments are the same as for the `Track` constructor.
+        """
+        if self._free:
+            track = self._free.pop()
+            track.reset(mean, covariance, track_id, n_init, max_age, feature)
+            self.num_reused += 1
+        else:
+            track = Track(mean, covariance, track_id, n_init, max_age,
+                          feature, store=self.store)
+            self.num_created += 1
+        return track
+
+    def release(self, track):
+        """Return a (deleted) track to the pool. The track must not be used
+        by the caller afterwards.
+        """
+        self.store.release(track.slot)
+        del track.features[:]
+        track.last_feature = None
+        self._free.append(track)
@@ -1,10 +1,14 @@
 # vim: expandtab:ts=4:sw=4
 from __future__ import absolute_import
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from . import kalman_filter
 from . import linear_assignment
 from . import iou_matching
-from .track import Track
+from .detection import DetectionBatch
+from .state_store import StateStore
+from .track import TrackPool
 
 
 class Tracker:
@@ -21,6 +25,15 @@ class Tracker:
         Number of consecutive detections before the track is confirmed. The
         track state is set to `Deleted` if a miss occurs within the first
         `n_init` frames.
+    iou_metric : Optional[str]
+        Overlap measure used to associate unconfirmed tracks, one of "iou",
+        "giou" or "diou" (see `iou_matching.iou_matrix`).
+    assignment_workers : Optional[int]
+        If larger than 0, independent assignment subproblems are solved on a
+        thread pool with this many workers.
+    assignment_backend : Optional[str]
+        Solver used for all assignment problems, one of "hungarian", "jv",
+        "greedy" or "auction" (see `linear_assignment.ASSIGNMENT_BACKENDS`).
 
     Attributes
     ----------
@@ -32,18 +45,35 @@ class Tracker:
         Number of frames that a track remains in initialization phase.
     kf : kalman_filter.KalmanFilter
         A Kalman filter to filter target trajectories in image space.
+    store : state_store.StateStore
+        Contiguous storage of the state distributions of all tracks.
+    pool : track.TrackPool
+        Recycles the track objects of deleted tracks.
     tracks : List[Track]
         The list of active tracks at the current time step.
 
     """
 
-    def __init__(self, metric, max_iou_distance=0.7, max_age=70, n_init=3):
+    def __init__(self, metric, max_iou_distance=0.7, max_age=70, n_init=3,
+                 iou_metric="iou", assignment_workers=0,
+                 assignment_backend="hungarian"):
         self.metric = metric
         self.max_iou_distance = max_iou_distance
         self.max_age = max_age
         self.n_init = n_init
+        self.iou_metric = iou_metric
+        self.executor = None
+        if assignment_workers > 0:
+            self.executor = ThreadPoolExecutor(assignment_workers)
+        if assignment_backend not in linear_assignment.ASSIGNMENT_BACKENDS:
+            raise ValueError(
+                "Invalid assignment backend; must be one of %s" % ", ".join(
+                    sorted(linear_assignment.ASSIGNMENT_BACKENDS)))
+        self.solver = linear_assignment.ASSIGNMENT_BACKENDS[assignment_backend]
 
         self.kf = kalman_filter.KalmanFilter()
+        self.store = StateStore()
+        self.pool = TrackPool(self.store)
         self.tracks = []
         self._next_id = 1
 
@@ -52,36 +82,86 @@ class Tracker:
 
         This function should be called once every time step, before `update`.
         """
+        self.store.predict(self.kf)
         for track in self.tracks:
-            track.predict(self.kf)
+            track.increment_age()
+
+    def propagate(self):
+        """Propagate track state distributions one time step forward on a
+        frame without detections (see `DetectionScheduler`).
+
+        Unlike `predict` followed by `increment_ages`, tracks that were
+        updated on the last detection frame are not counted as missed.
+        """
+        self.store.predict(self.kf)
+        for track in self.tracks:
+            track.age += 1
+            if track.time_since_update > 0:
+                track.time_since_update += 1
 
     def increment_ages(self):
         for track in self.tracks:
             track.increment_age()
             track.mark_missed()
 
-    def update(self, detections):
+    def update(self, detections, feature_provider=None):
         """Perform measurement update and track management.
 
         Parameters
         ----------
-        detections : List[deep_sort.detection.Detection]
-            A list of detections at the current time step.
+        detections : deep_sort.detection.DetectionBatch | List[Detection]
+            The detections at the current time step.
+        feature_provider : Optional[Callable[List[int]] -> ndarray]
+            If not None, detection features are computed lazily. Detections
+            without a feature get one from `feature_provider`, which is given
+            a list of detection indices and returns one feature per index,
+            only if they lie inside the gate of a confirmed track or are
+            associated with a track that needs it (see
+            `Track.needs_feature`).
 
         """
+        if not isinstance(detections, DetectionBatch):
+            detections = DetectionBatch.from_detections(detections)
+
         # Run matching cascade.
         matches, unmatched_tracks, unmatched_detections = \
-            self._match(detections)
+            self._match(detections, feature_provider)
+        if feature_provider is not None:
+            _provide_features(detections, [
+                detection_idx for track_idx, detection_idx in matches
+                if self.tracks[track_idx].needs_feature()], feature_provider)
 
         # Update track set.
+        measurements = detections.to_xyah()
+        if matches:
+            slots = [self.tracks[track_idx].slot for track_idx, _ in matches]
+            self.store.update(self.kf, slots, measurements[
+                [detection_idx for _, detection_idx in matches]])
         for track_idx, detection_idx in matches:
-            self.tracks[track_idx].update(
-                self.kf, detections[detection_idx])
+            track = self.tracks[track_idx]
+            track.mark_hit(
+                detections.get_feature(detection_idx),
+                detections.reused_feature[detection_idx])
+            track.confidence = detections.confidence[detection_idx]
+            track.class_id = detections.class_id[detection_idx]
         for track_idx in unmatched_tracks:
             self.tracks[track_idx].mark_missed()
         for detection_idx in unmatched_detections:
-            self._initiate_track(detections[detection_idx])
-        self.tracks = [t for t in self.tracks if not t.is_deleted()]
+            track = self._initiate_track(
+                measurements[detection_idx],
+                detections.get_feature(detection_idx))
+            track.confidence = detections.confidence[detection_idx]
+            track.class_id = detections.class_id[detection_idx]
+
+        # Compact the track list in place, recycling deleted tracks.
+        num_alive = 0
+        for track in self.tracks:
+            if track.is_deleted():
+                self.pool.release(track)
+            else:
+                self.tracks[num_alive] = track
+                num_alive += 1
+        del self.tracks[num_alive:]
 
         # Update distance metric.
         active_targets = [t.track_id for t in self.tracks if t.is_confirmed()]
@@ -91,14 +171,14 @@ class Tracker:
                 continue
             features += track.features
             targets += [track.track_id for _ in track.features]
-            track.features = []
+            del track.features[:]
         self.metric.partial_fit(
             np.asarray(features), np.asarray(targets), active_targets)
 
-    def _match(self, detections):
+    def _match(self, detections, feature_provider=None):
 
         def gated_metric(tracks, dets, track_indices, detection_indices):
-            features = np.array([dets[i].feature for i in detection_indices])
+            features = dets.feature[detection_indices]
             targets = np.array([tracks[i].track_id for i in track_indices])
             cost_matrix = self.metric.distance(features, targets)
             cost_matrix = linear_assignment.gate_cost_matrix(
@@ -113,11 +193,26 @@ class Tracker:
         unconfirmed_tracks = [
             i for i, t in enumerate(self.tracks) if not t.is_confirmed()]
 
+        # Only detections inside the gate of a confirmed track can be
+        # associated by appearance; compute their features if lazy.
+        cascade_detections = list(range(len(detections)))
+        ungated_detections = []
+        if feature_provider is not None:
+            gated = linear_assignment.gate_mask(
+                self.kf, self.tracks, detections, confirmed_tracks,
+                cascade_detections).any(axis=0)
+            cascade_detections = list(np.flatnonzero(gated))
+            ungated_detections = list(np.flatnonzero(~gated))
+            _provide_features(detections, cascade_detections, feature_provider)
+
         # Associate confirmed tracks using appearance features.
         matches_a, unmatched_tracks_a, unmatched_detections = \
             linear_assignment.matching_cascade(
                 gated_metric, self.metric.matching_threshold, self.max_age,
-                self.tracks, detections, confirmed_tracks)
+                self.tracks, detections, confirmed_tracks, cascade_detections,
+                executor=self.executor, solver=self.solver)
+        unmatched_detections = sorted(
+            list(unmatched_detections) + ungated_detections)
 
         # Associate remaining tracks together with unconfirmed tracks using IOU.
         iou_track_candidates = unconfirmed_tracks + [
@@ -128,16 +223,29 @@ class Tracker:
             self.tracks[k].time_since_update != 1]
         matches_b, unmatched_tracks_b, unmatched_detections = \
             linear_assignment.min_cost_matching(
-                iou_matching.iou_cost, self.max_iou_distance, self.tracks,
-                detections, iou_track_candidates, unmatched_detections)
+                functools.partial(
+                    iou_matching.iou_cost, metric=self.iou_metric),
+                self.max_iou_distance, self.tracks, detections,
+                iou_track_candidates, unmatched_detections, self.executor,
+                self.solver)
 
         matches = matches_a + matches_b
         unmatched_tracks = list(set(unmatched_tracks_a + unmatched_tracks_b))
         return matches, unmatched_tracks, unmatched_detections
 
-    def _initiate_track(self, detection):
-        mean, covariance = self.kf.initiate(detection.to_xyah())
-        self.tracks.append(Track(
+    def _initiate_track(self, measurement, feature):
+        mean, covariance = self.kf.initiate(measurement)
+        track = self.pool.acquire(
             mean, covariance, self._next_id, self.n_init, self.max_age,
-            detection.feature))
+            feature)
+        self.tracks.append(track)
         self._next_id += 1
+        return track
+
+
+def _provide_features(detections, detection_indices, feature_provider):
+    """Fill in the missing features of the given detections."""
+    detection_indices = np.asarray(detection_indices, dtype=np.int64)
+    missing = detection_indices[~detections.has_feature[detection_indices]]
+    if len(missing) > 0:
+        detections.set_features(missing, feature_provider(missing))
@@ -0,0 +1,97 @@
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+
+class InputStager(object):
+    """
+    Stages letterboxed uint8 frames (3xHxW or Nx3xHxW) as detector input.
+
+    For the `max_shapes` most recently used input shapes it keeps a float
+    input tensor on the device and, on CUDA, a pinned host buffer and a
+    uint8 device buffer. Older shapes are dropped, so the memory stays
+    bounded when the letterboxed shape changes from frame to frame (e.g.
+    with --motion-roi or --dynamic-img-size). The frame is
+    copied in as uint8, converted by a casting copy into the input tensor
+    and scaled to 0.0 - 1.0 in place, so steady-state frames allocate no
+    tensor memory. (A single mixed-dtype `torch.mul(..., out=)` would
+    materialize a float copy of the frame on the CPU.)
+
+    The returned tensor is only valid until the next call with the same
+    shape.
+    """
+
+    def __init__(self, device, half=False, max_shapes=2):
+        self.device = torch.device(device)
+        self.dtype = torch.float16 if half else torch.float32
+        self.max_shapes = max_shapes
+        self._scale = torch.tensor(1. / 255., dtype=self.dtype, device=self.device)
+        self._buffers = OrderedDict()
+
+    def _reserve(self, shape):
+        if shape in self._buffers:
+            self._buffers.move_to_end(shape)
+        else:
+            if len(self._buffers) >= self.max_shapes:
+                copied = self._buffers.popitem(last=False)[1][3]
+                if copied is not None:
+                    # let the last copy out of the pinned buffer finish
+                    copied.synchronize()
+            out = torch.empty(shape, dtype=self.dtype, device=self.device)
+            host = staged = copied = None
+            if self.device.type == 'cuda':
+                host = torch.empty(shape, dtype=torch.uint8, pin_memory=True)
+                staged = torch.empty(shape, dtype=torch.uint8, device=self.device)
+                copied = torch.cuda.Event()
+            self._buffers[shape] = (out, host, staged, copied)
+        return self._buffers[shape]
+
+    def __call__(self, img):
+        if img.ndim == 3:
+            img = img[None]
+        out, host, staged, copied = self._reserve(img.shape)
+        if host is None:
+            staged = torch.from_numpy(img)
+        else:
+            # the previous copy out of the pinned buffer must be done
+            copied.synchronize()
+            np.copyto(host.numpy(), img)
+            staged.copy_(host, non_blocking=True)
+            copied.record()
+        return out.copy_(staged).mul_(self._scale)
+
+
+if __name__ == '__main__':
+    import time
+    from torch.profiler import profile, ProfilerActivity
+
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    half = device == 'cuda'
+    img = np.random.randint(0, 255, (3, 384, 640), np.uint8)
+
+    def baseline(img):
+        img = torch.from_numpy(img).to(device)
+        img = img.half() if half else img.float()
+        img /= 255.0
+        if img.ndimension() == 3:
+            img = img.unsqueeze(0)
+        return img
+
+    stager = InputStager(device, half=half)
+    stager(img)
+    assert torch.allclose(stager(img), baseline(img))
+    activities = [ProfilerActivity.CPU] + ([ProfilerActivity.CUDA] if device == 'cuda' else [])
+    for name, fn in [('baseline', baseline), ('InputStager', stager)]:
+        with profile(activities=activities, profile_memory=True) as prof:
+            for _ in range(100):
+                fn(img)
+        allocations = sum(1 for e in prof.events()
+                          if e.name == '[memory]' and (e.cpu_memory_usage > 0 or e.device_memory_usage > 0))
+        start = time.perf_counter()
+        for _ in range(100):
+            fn(img)
+        if device == 'cuda':
+            torch.cuda.synchronize()
+        print('%-12s %.1f allocations per frame, %.3f ms per frame' % (
+            name, allocations / 100., 10. * (time.perf_counter() - start)))
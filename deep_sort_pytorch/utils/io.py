@@ -1,29 +1,132 @@
 import os
+import time
 from typing import Dict
 import numpy as np
 
 # from utils.log import get_logger
 
 
-def write_results(filename, results, data_type):
-    if data_type == 'mot':
-        save_format = '{frame},{id},{x1},{y1},{w},{h},-1,-1,-1,-1\n'
-    elif data_type == 'kitti':
-        save_format = '{frame} {id} pedestrian 0 0 -10 {x1} {y1} {x2} {y2} -10 -10 -10 -1000 -1000 -1000 -10\n'
-    else:
-        raise ValueError(data_type)
+# Columns of the result buffer of `ResultWriter`.
+RESULT_DTYPE = np.dtype([
+    ('frame', np.int32), ('track_id', np.int32),
+    ('x', np.float32), ('y', np.float32), ('w', np.float32), ('h', np.float32),
+    ('conf', np.float32), ('class', np.int32)])
+
+
+class ResultWriter(object):
+    """
+    Buffered writer of tracking results. The file stays open, rows are
+    collected in a preallocated array and written in bulk every
+    `flush_frames` frames or `flush_interval` seconds, whichever comes first.
+
+    Parameters
+    ----------
+    filename : str
+    data_type : str
+        'mot': MOT challenge text, frame,id,x,y,w,h,-1,-1,-1,-1
+        'kitti': KITTI tracking text
+        'bin': raw RESULT_DTYPE records, read with
+            `np.fromfile(filename, RESULT_DTYPE)`
+        'npz': one compressed array per RESULT_DTYPE column, written on
+            `close`
+    delimiter : str
+        Column separator of the 'mot' format.
+    mode : str
+        'w' to truncate or 'a' to append ('npz' only supports 'w').
+    """
+
+    def __init__(self, filename, data_type='mot', delimiter=',', mode='w',
+                 flush_frames=30, flush_interval=1.0, capacity=4096):
+        if data_type == 'mot':
+            self._row_format = delimiter.join(['%d', '%d', '%g', '%g', '%g', '%g', '-1', '-1', '-1', '-1']) + '\n'
+        elif data_type == 'kitti':
+            self._row_format = '%d %d pedestrian 0 0 -10 %g %g %g %g -10 -10 -10 -1000 -1000 -1000 -10\n'
+        elif data_type not in ('bin', 'npz'):
+            raise ValueError(data_type)
+        if data_type == 'npz' and mode != 'w':
+            raise ValueError('npz results can not be appended')
+        self.filename = filename
+        self.data_type = data_type
+        self.flush_frames = flush_frames
+        self.flush_interval = flush_interval
+        self._file = None
+        if data_type != 'npz':
+            binary = 'b' if data_type == 'bin' else ''
+            self._file = open(filename, mode + binary)
+        self._chunks = []
+        self._rows = np.zeros(capacity, RESULT_DTYPE)
+        self._size = 0
+        self._frames = 0
+        self._last_flush = time.monotonic()
+
+    def write(self, frame_id, tlwhs, track_ids, confs=None, class_ids=None):
+        """
+        Add the results of one frame. Rows with a negative track id are
+        skipped.
+        """
+        track_ids = np.asarray(track_ids).reshape(-1)
+        keep = track_ids >= 0
+        n = int(keep.sum())
+        if self._size + n > len(self._rows):
+            self.flush()
+            if n > len(self._rows):
+                self._rows = np.zeros(n, RESULT_DTYPE)
+        rows = self._rows[self._size:self._size + n]
+        tlwhs = np.asarray(tlwhs, dtype=np.float32).reshape(-1, 4)[keep]
+        rows['frame'] = frame_id
+        rows['track_id'] = track_ids[keep]
+        rows['x'], rows['y'], rows['w'], rows['h'] = tlwhs.T
+        rows['conf'] = -1 if confs is None else np.asarray(confs).reshape(-1)[keep]
+        rows['class'] = -1 if class_ids is None else np.asarray(class_ids).reshape(-1)[keep]
+        self._size += n
+
+        self._frames += 1
+        if self._frames >= self.flush_frames or \
+                time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        rows = self._rows[:self._size]
+        if self.data_type == 'npz':
+            self._chunks.append(rows.copy())
+        elif self.data_type == 'bin':
+            rows.tofile(self._file)
+        elif len(rows):
+            frame = rows['frame']
+            if self.data_type == 'kitti':
+                columns = [frame - 1, rows['track_id'], rows['x'], rows['y'],
+                           rows['x'] + rows['w'], rows['y'] + rows['h']]
+            else:
+                columns = [frame, rows['track_id'], rows['x'], rows['y'], rows['w'], rows['h']]
+            values = np.stack(columns, axis=1).astype(np.float64).ravel().tolist()
+            self._file.write((self._row_format * len(rows)) % tuple(values))
+        if self._file is not None:
+            self._file.flush()
+        self._size = 0
+        self._frames = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        if self.data_type == 'npz':
+            rows = np.concatenate(self._chunks) if self._chunks else self._rows[:0]
+            np.savez_compressed(self.filename, **{name: rows[name] for name in RESULT_DTYPE.names})
+            self._chunks = []
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 
-    with open(filename, 'w') as f:
+def write_results(filename, results, data_type):
+    with ResultWriter(filename, data_type) as writer:
         for frame_id, tlwhs, track_ids in results:
-            if data_type == 'kitti':
-                frame_id -= 1
-            for tlwh, track_id in zip(tlwhs, track_ids):
-                if track_id < 0:
-                    continue
-                x1, y1, w, h = tlwh
-                x2, y2 = x1 + w, y1 + h
-                line = save_format.format(frame=frame_id, id=track_id, x1=x1, y1=y1, x2=x2, y2=y2, w=w, h=h)
-                f.write(line)
+            writer.write(frame_id, tlwhs, track_ids)
 
 
 # def write_results(filename, results_dict: Dict, data_type: str):
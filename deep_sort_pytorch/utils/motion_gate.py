@@ -0,0 +1,114 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate(object):
+    """
+    Cheap change detector in front of the object detector. Every frame is
+    downscaled to `width` pixels, converted to blurred grayscale and compared
+    with a running-average background model.
+
+    Parameters
+    ----------
+    width : int
+        Width of the downscaled frame the gate works on.
+    threshold : int
+        Minimum gray level difference of a changed pixel.
+    min_changed : float
+        Minimum fraction of changed pixels for the frame to count as changed.
+    alpha : float
+        Update rate of the background model; objects that stop moving fade
+        into the background after roughly 1 / alpha frames.
+    max_roi : float
+        `changed_box` returns None if the changed region covers more than
+        this fraction of the frame, since cropping would not pay off.
+
+    Attributes
+    ----------
+    changed : bool
+        Whether the last frame changed.
+    num_frames : int
+        Number of frames seen so far.
+    num_changed : int
+        Number of changed frames so far.
+    elapsed : float
+        Seconds spent in `update` so far.
+    """
+
+    def __init__(self, width=160, threshold=20, min_changed=0.001, alpha=0.05,
+                 max_roi=0.5):
+        self.width = width
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.alpha = alpha
+        self.max_roi = max_roi
+        self.background = None
+        self.mask = None
+        self.changed = True
+        self.num_frames = 0
+        self.num_changed = 0
+        self.elapsed = 0.
+        self._frame_shape = None
+
+    def update(self, frame):
+        """
+        Compare a BGR frame with the background model, then blend it into
+        the model. Returns True if the frame changed; the first frame always
+        does.
+        """
+        start = time.perf_counter()
+        height, width = frame.shape[:2]
+        small = cv2.resize(
+            frame, (self.width, max(1, round(height * self.width / width))),
+            interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            self.mask = np.ones(gray.shape, dtype=bool)
+        else:
+            diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+            self.mask = diff > self.threshold
+            cv2.accumulateWeighted(gray, self.background, self.alpha)
+        self.changed = bool(self.mask.mean() >= self.min_changed)
+        self._frame_shape = (height, width)
+
+        self.num_frames += 1
+        self.num_changed += self.changed
+        self.elapsed += time.perf_counter() - start
+        return self.changed
+
+    def changed_box(self, margin=0.25, track_boxes=(), track_margin=0.1):
+        """
+        Bounding box (x1, y1, x2, y2), in frame coordinates, of the changed
+        pixels of the last frame and of `track_boxes`. The changed region is
+        grown by `margin` and every track box by `track_margin` times its
+        size on each side. The live tracks must be covered too: objects that
+        stop moving fade into the background, and without detections their
+        tracks would be deleted and come back under new IDs.
+        Returns None if there is nothing to cover or the box is larger than
+        `max_roi` of the frame.
+        """
+        height, width = self._frame_shape
+        boxes = []
+        if self.changed:
+            ys, xs = np.nonzero(self.mask)
+            scale = width / self.mask.shape[1]
+            boxes.append(_grow((xs.min() * scale, ys.min() * scale,
+                                (xs.max() + 1) * scale, (ys.max() + 1) * scale), margin))
+        boxes += [_grow(box, track_margin) for box in track_boxes]
+        if not boxes:
+            return None
+        boxes = np.array(boxes)
+        x1, y1 = int(max(boxes[:, 0].min(), 0)), int(max(boxes[:, 1].min(), 0))
+        x2, y2 = int(min(boxes[:, 2].max(), width)), int(min(boxes[:, 3].max(), height))
+        if x2 <= x1 or y2 <= y1 or (x2 - x1) * (y2 - y1) > self.max_roi * width * height:
+            return None
+        return x1, y1, x2, y2
+
+
+def _grow(box, margin):
+    x1, y1, x2, y2 = box
+    dx, dy = margin * (x2 - x1), margin * (y2 - y1)
+    return x1 - dx, y1 - dy, x2 + dx, y2 + dy
@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class Stage(object):
+    """
+    One pipeline stage: a function applied to every item in its own thread.
+
+    Attributes
+    ----------
+    name : str
+    fn : callable
+        Called with the item of the previous stage, returns the item passed
+        to the next stage. The source stage iterates instead.
+    busy : float
+        Seconds spent in `fn`.
+    count : int
+        Number of items processed.
+    depth : int
+        Sum of the input queue lengths seen when taking an item; divided by
+        `count` it gives the mean queue depth. A full input queue means this
+        stage is the bottleneck, an empty one that it is starved.
+    """
+
+    def __init__(self, name, fn):
+        self.name = name
+        self.fn = fn
+        self.busy = 0.
+        self.count = 0
+        self.depth = 0
+
+
+class Pipeline(object):
+    """
+    Run an iterable and a chain of functions in separate threads connected by
+    bounded FIFO queues, such that stage k of item t overlaps stage k-1 of
+    item t+1. Every stage has a single thread, so items pass each stage in
+    source order.
+
+    Parameters
+    ----------
+    source : Tuple[str, iterable]
+        Name and iterable of the first stage.
+    stages : List[Tuple[str, callable]]
+        Names and functions of the following stages. The return value of the
+        last function is dropped.
+    queue_size : int
+        Maximum number of items waiting in front of each stage.
+    """
+
+    def __init__(self, source, stages, queue_size=2):
+        self.source = Stage(source[0], source[1])
+        self.stages = [Stage(name, fn) for name, fn in stages]
+        self.queues = [queue.Queue(queue_size) for _ in self.stages]
+        self.elapsed = 0.
+        self._stop = threading.Event()
+        self._error = None
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    def _run_source(self):
+        stage, out_q = self.source, self.queues[0]
+        try:
+            items = iter(stage.fn)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                stage.busy += time.perf_counter() - start
+                stage.count += 1
+                if not self._put(out_q, item):
+                    return
+            self._put(out_q, _DONE)
+        except BaseException as e:
+            self._fail(e)
+
+    def _run_stage(self, k):
+        stage = self.stages[k]
+        in_q = self.queues[k]
+        out_q = self.queues[k + 1] if k + 1 < len(self.stages) else None
+        try:
+            while True:
+                depth = in_q.qsize()
+                item = self._get(in_q)
+                if item is _DONE:
+                    break
+                start = time.perf_counter()
+                result = stage.fn(item)
+                stage.busy += time.perf_counter() - start
+                stage.count += 1
+                stage.depth += depth
+                if out_q is not None and not self._put(out_q, result):
+                    return
+            if out_q is not None:
+                self._put(out_q, _DONE)
+        except BaseException as e:
+            self._fail(e)
+
+    def run(self):
+        """
+        Process all items of the source. Re-raises the first exception of
+        any stage, after stopping the others.
+        """
+        threads = [threading.Thread(target=self._run_source, daemon=True)]
+        threads += [threading.Thread(target=self._run_stage, args=(k,), daemon=True)
+                    for k in range(len(self.stages))]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.1)
+        except KeyboardInterrupt:
+            self._stop.set()
+            raise
+        finally:
+            self.elapsed = time.perf_counter() - start
+        if self._error is not None:
+            raise self._error
+
+    def report(self):
+        """Per-stage time per item, utilisation and mean input queue depth."""
+        stages = [self.source] + self.stages
+        width = max([10] + [len(stage.name) for stage in stages])
+        lines = ['%-*s %8s %10s %6s %6s' % (width, 'stage', 'items', 'ms/item', 'util', 'queue')]
+        for stage in stages:
+            count = max(stage.count, 1)
+            depth = '%.2f' % (stage.depth / count) if stage is not self.source else '-'
+            lines.append('%-*s %8d %10.1f %5.0f%% %6s' % (
+                width, stage.name, stage.count, 1000. * stage.busy / count,
+                100. * stage.busy / max(self.elapsed, 1e-9), depth))
+        return '\n'.join(lines)
@@ -0,0 +1,113 @@
+import cv2
+import numpy as np
+import torch
+import torchvision
+
+
+def tile_boxes(box, rows, cols, overlap=0.):
+    """
+    Split a box (x1, y1, x2, y2) into a `rows` x `cols` grid of tiles that
+    overlap their neighbours by `overlap` times the tile size.
+    """
+    x1, y1, x2, y2 = box
+    tile_w = (x2 - x1) / (cols - (cols - 1) * overlap)
+    tile_h = (y2 - y1) / (rows - (rows - 1) * overlap)
+    tiles = []
+    for r in range(rows):
+        for c in range(cols):
+            tx = x1 + c * tile_w * (1 - overlap)
+            ty = y1 + r * tile_h * (1 - overlap)
+            tiles.append((int(round(tx)), int(round(ty)),
+                          int(round(min(tx + tile_w, x2))), int(round(min(ty + tile_h, y2)))))
+    return tiles
+
+
+class DetectionRegions(object):
+    """
+    The parts of a frame the detector runs on: the bounding box of every ROI
+    polygon, or the whole frame without polygons, split into a tile grid.
+    Detections of all regions are merged with a cross-region NMS and, with
+    polygons, only those whose box center lies inside a polygon are kept.
+
+    Parameters
+    ----------
+    polygons : List[ndarray]
+        ROI polygons as Kx2 arrays of (x, y) frame coordinates.
+    tiles : Tuple[int, int]
+        Rows and columns of the tile grid of each region.
+    overlap : float
+        Overlap of neighbouring tiles, relative to the tile size, such that
+        objects cut by one tile border are whole in the other tile.
+
+    Attributes
+    ----------
+    num_frames : int
+        Number of frames split so far.
+    num_regions : int
+        Number of regions (crops) so far.
+    region_pixels : int
+        Frame pixels covered by the regions so far, counted once per region.
+    frame_pixels : int
+        Pixels of the split frames so far.
+    """
+
+    def __init__(self, polygons=(), tiles=(1, 1), overlap=0.1):
+        self.polygons = [np.asarray(p, dtype=np.int32).reshape(-1, 2) for p in polygons]
+        self.tiles = tiles
+        self.overlap = overlap
+        self.num_frames = 0
+        self.num_regions = 0
+        self.region_pixels = 0
+        self.frame_pixels = 0
+        self._boxes = {}
+
+    def boxes(self, height, width):
+        """The regions (x1, y1, x2, y2) of a frame of the given size."""
+        if (height, width) not in self._boxes:
+            roi_boxes = [(0, 0, width, height)]
+            if self.polygons:
+                roi_boxes = []
+                for polygon in self.polygons:
+                    x, y, w, h = cv2.boundingRect(polygon)
+                    roi_boxes.append((max(x, 0), max(y, 0), min(x + w, width), min(y + h, height)))
+            self._boxes[(height, width)] = [
+                tile for box in roi_boxes for tile in tile_boxes(box, *self.tiles, self.overlap)]
+        return self._boxes[(height, width)]
+
+    def split(self, frame):
+        """Returns the regions of `frame` and their crops."""
+        boxes = self.boxes(*frame.shape[:2])
+        self.num_frames += 1
+        self.num_regions += len(boxes)
+        self.region_pixels += sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in boxes)
+        self.frame_pixels += frame.shape[0] * frame.shape[1]
+        return boxes, [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+
+    def merge(self, dets, iou_thres, agnostic=False):
+        """
+        Merge the detections of the regions of one frame.
+
+        dets: list of Nx6 tensors of (x1, y1, x2, y2, conf, cls) in frame
+            coordinates, one per region
+        returns: Mx6 tensor, sorted by decreasing confidence
+        """
+        det = torch.cat(dets)
+        if len(det) == 0:
+            return det
+        classes = torch.zeros_like(det[:, 5]) if agnostic else det[:, 5]
+        det = det[torchvision.ops.batched_nms(det[:, :4].float(), det[:, 4].float(), classes, iou_thres)]
+        if self.polygons:
+            centers = ((det[:, :2] + det[:, 2:4]) / 2).cpu().numpy()
+            inside = [any(cv2.pointPolygonTest(polygon, (float(x), float(y)), False) >= 0
+                          for polygon in self.polygons) for x, y in centers]
+            det = det[torch.as_tensor(inside, dtype=torch.bool, device=det.device)]
+        return det
+
+    def report(self, input_size):
+        """Pixels per frame read from the frames and fed to the detector."""
+        frames = max(self.num_frames, 1)
+        return ('Detection regions: %.1f per frame, %.2f Mpixel per frame (%.0f%% of the frame), '
+                '%.2f Mpixel detector input per frame' % (
+                    self.num_regions / frames, self.region_pixels / frames / 1e6,
+                    100. * self.region_pixels / max(self.frame_pixels, 1),
+                    self.num_regions * input_size[0] * input_size[1] / frames / 1e6))
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+import torch
+
+from deep_sort_pytorch.deep_sort.deep.feature_extractor import Extractor
+from deep_sort_pytorch.deep_sort.deep.model import Net
+
+
+@pytest.fixture(scope="module")
+def checkpoint(tmp_path_factory):
+    torch.manual_seed(0)
+    path = tmp_path_factory.mktemp("reid") / "ckpt.t7"
+    torch.save({"net_dict": Net(reid=True).state_dict()}, path)
+    return str(path)
+
+
+def _frame_and_boxes(num_boxes=7, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    heights = rng.integers(130, 400, num_boxes)
+    widths = rng.integers(65, 160, num_boxes)
+    x1 = rng.integers(0, 640 - widths)
+    y1 = rng.integers(0, 480 - heights)
+    return frame, np.stack([x1, y1, x1 + widths, y1 + heights], axis=1)
+
+
+def test_batch_resample_matches_crop_path(checkpoint):
+    extractor = Extractor(checkpoint, use_cuda=False)
+    frame, boxes = _frame_and_boxes()
+    crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+    expected = extractor._preprocess(crops).clone()
+    batch = extractor._preprocess_boxes(frame, boxes)
+    # fixed-point uint8 resizing is within one gray level, divided by the
+    # smallest ImageNet std
+    assert (batch - expected).abs().max().item() < 1. / 255. / 0.224
+
+
+@pytest.mark.parametrize("batch_buckets", [None, [1, 4]])
+def test_extract_boxes_paths_agree(checkpoint, batch_buckets):
+    extractor = Extractor(checkpoint, use_cuda=False, batch_buckets=batch_buckets)
+    frame, boxes = _frame_and_boxes()
+    extractor.batch_resample = False
+    expected = extractor.extract_boxes(frame, boxes)
+    extractor.batch_resample = True
+    features = extractor.extract_boxes(frame, boxes)
+    assert features.shape == expected.shape == (len(boxes), 512)
+    np.testing.assert_allclose(features, expected, atol=2e-2)
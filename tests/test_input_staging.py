@@ -0,0 +1,31 @@
+import numpy as np
+import torch
+
+from deep_sort_pytorch.utils.input_staging import InputStager
+
+
+def test_cache_is_bounded():
+    stager = InputStager('cpu', max_shapes=2)
+    for height in range(64, 64 + 32 * 10, 32):
+        img = np.random.randint(0, 255, (3, height, 96), np.uint8)
+        out = stager(img)
+        assert out.shape == (1, 3, height, 96)
+        assert torch.allclose(out, torch.from_numpy(img)[None].float() / 255.)
+        assert len(stager._buffers) <= 2
+
+
+def test_reuses_recent_shapes():
+    stager = InputStager('cpu', max_shapes=2)
+    small = np.zeros((3, 32, 32), np.uint8)
+    large = np.zeros((3, 64, 64), np.uint8)
+    first = stager(small)
+    stager(large)
+    assert stager(small).data_ptr() == first.data_ptr()
+
+
+def test_buffers_stay_stable_across_cycled_shapes():
+    stager = InputStager('cpu', max_shapes=3)
+    images = [np.zeros((3, size, size), np.uint8) for size in (32, 48, 64)]
+    pointers = [stager(img).data_ptr() for img in images]
+    for _ in range(5):
+        assert [stager(img).data_ptr() for img in images] == pointers
@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from scipy.optimize import linear_sum_assignment
+
+from deep_sort_pytorch.deep_sort.sort import linear_assignment
+
+MAX_DISTANCE = 0.5
+INFEASIBLE = MAX_DISTANCE + 1e-5
+
+
+def _gated_matrices(num_matrices=100, max_size=40, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(num_matrices):
+        num_rows, num_cols = rng.integers(1, max_size, 2)
+        cost_matrix = rng.random((num_rows, num_cols))
+        # Sparse gates give several connected components.
+        cost_matrix[rng.random((num_rows, num_cols)) < 0.8] = INFEASIBLE
+        cost_matrix[cost_matrix > MAX_DISTANCE] = INFEASIBLE
+        yield cost_matrix
+
+
+def _total_cost(cost_matrix, row_indices, col_indices):
+    """Cost of the full assignment that pairs the rows and columns left
+    without a feasible match at the infeasible cost."""
+    costs = cost_matrix[row_indices, col_indices]
+    costs = costs[costs <= MAX_DISTANCE]
+    return costs.sum() + (min(cost_matrix.shape) - len(costs)) * INFEASIBLE
+
+
+def _check_disjoint_feasible(cost_matrix, row_indices, col_indices):
+    assert len(row_indices) == len(col_indices)
+    assert len(np.unique(row_indices)) == len(row_indices)
+    assert len(np.unique(col_indices)) == len(col_indices)
+    assert np.all(cost_matrix[row_indices, col_indices] <= MAX_DISTANCE)
+
+
+@pytest.mark.parametrize("backend", ["hungarian", "jv"])
+def test_exact_backends_reach_optimal_cost(backend):
+    solver = linear_assignment.ASSIGNMENT_BACKENDS[backend]
+    with ThreadPoolExecutor(2) as executor:
+        for cost_matrix in _gated_matrices():
+            expected = cost_matrix[linear_sum_assignment(cost_matrix)].sum()
+            solutions = [
+                solver(cost_matrix, MAX_DISTANCE),
+                linear_assignment.solve_assignment(
+                    cost_matrix, MAX_DISTANCE, solver=solver),
+                linear_assignment.solve_assignment(
+                    cost_matrix, MAX_DISTANCE, executor, solver)]
+            for row_indices, col_indices in solutions:
+                assert _total_cost(cost_matrix, row_indices, col_indices) == \
+                    pytest.approx(expected)
+
+
+def test_solve_assignment_decomposes_large_problems():
+    cost_matrix = np.full((30, 30), INFEASIBLE)
+    cost_matrix[np.arange(30), np.arange(30)] = 0.1
+    assert cost_matrix.size >= linear_assignment.MIN_DECOMPOSITION_SIZE
+    assert len(linear_assignment.split_components(cost_matrix, MAX_DISTANCE)) == 30
+    row_indices, col_indices = linear_assignment.solve_assignment(
+        cost_matrix, MAX_DISTANCE)
+    np.testing.assert_array_equal(row_indices, np.arange(30))
+    np.testing.assert_array_equal(col_indices, np.arange(30))
+
+
+@pytest.mark.parametrize("backend", ["greedy", "auction"])
+def test_approximate_backends_return_feasible_disjoint_pairs(backend):
+    solver = linear_assignment.ASSIGNMENT_BACKENDS[backend]
+    for cost_matrix in _gated_matrices():
+        _check_disjoint_feasible(cost_matrix, *solver(cost_matrix, MAX_DISTANCE))
+        _check_disjoint_feasible(cost_matrix, *linear_assignment.solve_assignment(
+            cost_matrix, MAX_DISTANCE, solver=solver))
@@ -0,0 +1,62 @@
+import numpy as np
+
+from deep_sort_pytorch.deep_sort.sort.detection import Detection
+from deep_sort_pytorch.deep_sort.sort.nn_matching import NearestNeighborDistanceMetric
+from deep_sort_pytorch.deep_sort.sort.tracker import Tracker
+from deep_sort_pytorch.utils.motion_gate import MotionGate
+
+
+def _run(num_frames, use_tracks):
+    """
+    A static object on the left and an object moving on the right. The
+    detector only finds objects that lie inside the motion ROI.
+    """
+    gate = MotionGate()
+    metric = NearestNeighborDistanceMetric("cosine", 0.2, 100)
+    tracker = Tracker(metric, max_age=10, n_init=3)
+    static = (50, 200, 90, 280)
+    ids = []
+    for frame_idx in range(num_frames):
+        x = 300 + 3 * frame_idx
+        moving = (x, 180, x + 40, 260)
+        frame = np.zeros((480, 640, 3), np.uint8)
+        for x1, y1, x2, y2 in (static, moving):
+            frame[y1:y2, x1:x2] = 255
+
+        gate.update(frame)
+        track_boxes = [t.to_tlbr() for t in tracker.tracks] if use_tracks else ()
+        roi = gate.changed_box(track_boxes=track_boxes)
+        if roi is None:
+            roi = (0, 0, 640, 480)
+        detections = []
+        for box, feature in ((static, [1, 0]), (moving, [0, 1])):
+            if box[0] >= roi[0] and box[1] >= roi[1] and box[2] <= roi[2] and box[3] <= roi[3]:
+                detections.append(Detection(
+                    [box[0], box[1], box[2] - box[0], box[3] - box[1]], 0.9, feature))
+        tracker.predict()
+        tracker.update(detections)
+        ids.append({t.track_id for t in tracker.tracks
+                    if t.is_confirmed() and t.to_tlbr()[0] < 200})
+    return ids
+
+
+def test_changed_box_keeps_static_tracks():
+    ids = _run(80, use_tracks=True)
+    assert ids[10] == ids[-1] and len(ids[-1]) == 1
+
+
+def test_changed_box_without_tracks_loses_static_object():
+    # the static object fades into the background and leaves the ROI
+    ids = _run(80, use_tracks=False)
+    assert ids[-1] == set()
+
+
+def test_changed_box_without_change_covers_tracks():
+    gate = MotionGate()
+    frame = np.zeros((480, 640, 3), np.uint8)
+    gate.update(frame)
+    gate.update(frame)
+    assert not gate.changed
+    assert gate.changed_box() is None
+    assert gate.changed_box(track_boxes=[(100, 100, 200, 300)], track_margin=0.1) == \
+        (90, 80, 210, 320)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from deep_sort_pytorch.deep_sort.sort.nn_matching import NearestNeighborDistanceMetric
+
+
+@pytest.mark.parametrize("metric", ["cosine", "euclidean"])
+def test_distance_matches_brute_force(metric):
+    rng = np.random.default_rng(0)
+    nn = NearestNeighborDistanceMetric(metric, 0.2, budget=5)
+    targets = [1, 2, 3]
+    history = {k: [] for k in targets}
+    for _ in range(8):
+        features = rng.standard_normal((3, 16))
+        nn.partial_fit(features, targets, targets)
+        for k, f in zip(targets, features):
+            history[k] = (history[k] + [f])[-5:]
+    queries = rng.standard_normal((4, 16))
+
+    cost = nn.distance(queries, targets + [42])
+
+    for i, k in enumerate(targets):
+        samples = np.array(history[k])
+        if metric == "cosine":
+            a = samples / np.linalg.norm(samples, axis=1, keepdims=True)
+            b = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+            expected = (1. - a @ b.T).min(axis=0)
+        else:
+            expected = ((samples[:, None] - queries[None]) ** 2).sum(-1).min(axis=0)
+        np.testing.assert_allclose(cost[i], expected, rtol=1e-4, atol=1e-4)
+    assert np.isinf(cost[-1]).all()
+
+
+def test_distance_reuses_buffers():
+    rng = np.random.default_rng(0)
+    nn = NearestNeighborDistanceMetric("cosine", 0.2, budget=10)
+    targets = list(range(20))
+    nn.partial_fit(rng.standard_normal((20, 32)), targets, targets)
+    nn.distance(rng.standard_normal((6, 32)), targets)
+    buffers = {k: v.ctypes.data for k, v in nn._scratch_buffers.items()}
+    nn.distance(rng.standard_normal((4, 32)), targets[:15])
+    assert {k: v.ctypes.data for k, v in nn._scratch_buffers.items()} == buffers
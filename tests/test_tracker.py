@@ -0,0 +1,30 @@
+import numpy as np
+
+from deep_sort_pytorch.deep_sort.sort.detection import Detection, DetectionBatch
+from deep_sort_pytorch.deep_sort.sort.nn_matching import NearestNeighborDistanceMetric
+from deep_sort_pytorch.deep_sort.sort.tracker import Tracker
+
+
+def test_update_with_list_of_detections():
+    metric = NearestNeighborDistanceMetric("cosine", 0.2, 100)
+    tracker = Tracker(metric, n_init=3)
+    feature = np.ones(8, dtype=np.float32)
+    for frame in range(5):
+        tracker.predict()
+        tracker.update([Detection([10 + 2 * frame, 20, 30, 60], 0.9, feature),
+                        Detection([200, 100 + frame, 40, 80], 0.8, feature)])
+
+    assert len(tracker.tracks) == 2
+    assert all(t.is_confirmed() for t in tracker.tracks)
+    assert sorted(t.track_id for t in tracker.tracks) == [1, 2]
+
+
+def test_detection_batch_round_trip():
+    detections = [Detection([1, 2, 3, 4], 0.5, None),
+                  Detection([5, 6, 7, 8], 0.7, np.arange(4))]
+    batch = DetectionBatch.from_detections(detections)
+
+    assert batch.tlwh.dtype == np.float64
+    np.testing.assert_array_equal(batch[1].tlwh, [5, 6, 7, 8])
+    np.testing.assert_array_equal(batch[1].feature, np.arange(4))
+    assert batch[0].feature is None
@@ -3,19 +3,29 @@ sys.path.insert(0, './yolov5')
 
 from yolov5.utils.google_utils import attempt_download
 from yolov5.models.experimental import attempt_load
-from yolov5.utils.datasets import LoadImages, LoadStreams
+from yolov5.utils.datasets import LoadImages, LoadStreams, letterbox
 from yolov5.utils.general import check_img_size, non_max_suppression, scale_coords, \
     check_imshow
 from yolov5.utils.torch_utils import select_device, time_synchronized
 from deep_sort_pytorch.utils.parser import get_config
+from deep_sort_pytorch.utils.log import get_logger
 from deep_sort_pytorch.deep_sort import DeepSort
+from deep_sort_pytorch.deep_sort.deep.reid_service import ReIDService
+from deep_sort_pytorch.deep_sort.sort.detection_scheduler import DetectionScheduler, ResolutionScheduler
+from deep_sort_pytorch.utils.pipeline import Pipeline
+from deep_sort_pytorch.utils.io import ResultWriter
+from deep_sort_pytorch.utils.motion_gate import MotionGate
+from deep_sort_pytorch.utils.tiling import DetectionRegions
+from deep_sort_pytorch.utils.input_staging import InputStager
 import argparse
 import os
 import platform
 import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import cv2
+import numpy as np
 import torch
 import torch.backends.cudnn as cudnn
 
@@ -24,31 +34,6 @@ import torch.backends.cudnn as cudnn
 palette = (2 ** 11 - 1, 2 ** 15 - 1, 2 ** 20 - 1)
 
 
-def xyxy_to_xywh(*xyxy):
-    """" Calculates the relative bounding box from absolute pixel values. """
-    bbox_left = min([xyxy[0].item(), xyxy[2].item()])
-    bbox_top = min([xyxy[1].item(), xyxy[3].item()])
-    bbox_w = abs(xyxy[0].item() - xyxy[2].item())
-    bbox_h = abs(xyxy[1].item() - xyxy[3].item())
-    x_c = (bbox_left + bbox_w / 2)
-    y_c = (bbox_top + bbox_h / 2)
-    w = bbox_w
-    h = bbox_h
-    return x_c, y_c, w, h
-
-def xyxy_to_tlwh(bbox_xyxy):
-    tlwh_bboxs = []
-    for i, box in enumerate(bbox_xyxy):
-        x1, y1, x2, y2 = [int(i) for i in box]
-        top = x1
-        left = y1
-        w = int(x2 - x1)
-        h = int(y2 - y1)
-        tlwh_obj = [top, left, w, h]
-        tlwh_bboxs.append(tlwh_obj)
-    return tlwh_bboxs
-
-
 def compute_color_for_labels(label):
     """
     Simple function that adds fixed color depending on the class
@@ -84,7 +69,9 @@ def detect(opt):
     webcam = source == '0' or source.startswith(
         'rtsp') or source.startswith('http') or source.endswith('.txt')
 
-    # initialize deepsort
+    # initialize deepsort; the extractor reports the loaded model and the ReID
+    # batch profile through this logger
+    get_logger('root.tracker')
     cfg = get_config()
     cfg.merge_from_file(opt.config_deepsort)
     attempt_download(deep_sort_weights, repo='mikel-brostrom/Yolov5_DeepSort_Pytorch')
@@ -92,7 +79,13 @@ def detect(opt):
                         max_dist=cfg.DEEPSORT.MAX_DIST, min_confidence=cfg.DEEPSORT.MIN_CONFIDENCE,
                         nms_max_overlap=cfg.DEEPSORT.NMS_MAX_OVERLAP, max_iou_distance=cfg.DEEPSORT.MAX_IOU_DISTANCE,
                         max_age=cfg.DEEPSORT.MAX_AGE, n_init=cfg.DEEPSORT.N_INIT, nn_budget=cfg.DEEPSORT.NN_BUDGET,
-                        use_cuda=True)
+                        use_cuda=True, assignment_backend=cfg.DEEPSORT.ASSIGNMENT_BACKEND,
+                        reid_refresh_interval=cfg.DEEPSORT.REID_REFRESH_INTERVAL,
+                        lazy_reid=cfg.DEEPSORT.LAZY_REID,
+                        int8_model_path=cfg.DEEPSORT.REID_INT8_CKPT,
+                        reid_backend=cfg.DEEPSORT.REID_BACKEND,
+                        reid_batch_buckets=cfg.DEEPSORT.REID_BATCH_BUCKETS,
+                        reid_profile=cfg.DEEPSORT.REID_PROFILE)
 
     # Initialize
     device = select_device(opt.device)
@@ -115,7 +108,6 @@ def detect(opt):
         model.half()  # to FP16
 
     # Set Dataloader
-    vid_path, vid_writer = None, None
     # Check if environment supports image displays
     if show_vid:
         show_vid = check_imshow()
@@ -126,10 +118,51 @@ def detect(opt):
     else:
         dataset = LoadImages(source, img_size=imgsz)
 
+    # one tracker, video writer and result file per stream; the streams are
+    # detected in one batch and share the ReID network
+    num_streams = len(dataset.sources) if webcam else 1
+    reid_service, tracking_pool = None, None
+    if num_streams > 1 and cfg.DEEPSORT.REID_SERVICE_MAX_WAIT > 0:
+        reid_service = ReIDService(deepsort.extractor,
+                                   max_batch_size=cfg.DEEPSORT.REID_SERVICE_MAX_BATCH,
+                                   max_wait=cfg.DEEPSORT.REID_SERVICE_MAX_WAIT)
+        deepsort.extractor = reid_service
+        tracking_pool = ThreadPoolExecutor(num_streams)
+    deepsorts = [deepsort] + [deepsort.spawn() for _ in range(num_streams - 1)]
+    vid_path, vid_writer = [None] * num_streams, [None] * num_streams
+
+    # run the detector on every --detect-every frame, or adaptively at most
+    # that rarely; the trackers predict their tracks in between
+    detection_scheduler = DetectionScheduler(opt.detect_every, adaptive=opt.adaptive_stride)
+
+    # ROI polygons and/or tile grid the detector runs on, instead of the
+    # whole letterboxed frame
+    regions = None
+    if opt.roi or opt.tiles != '1x1':
+        regions = DetectionRegions(
+            polygons=[np.array(roi.split(','), dtype=np.int32).reshape(-1, 2) for roi in opt.roi or []],
+            tiles=tuple(int(n) for n in opt.tiles.split('x')), overlap=opt.tile_overlap)
+
+    # per-frame detector input size from the smallest track
+    resolution_scheduler = None
+    if opt.dynamic_img_size:
+        sizes = {check_img_size(int(imgsz * f), s=stride) for f in (0.5, 0.75, 1.)}
+        resolution_scheduler = ResolutionScheduler(
+            sizes, min_height=opt.min_track_height, probe_interval=opt.probe_interval)
+
+    # frame-difference gate per stream in front of the detector
+    motion_gates = [MotionGate() for _ in range(num_streams)] if opt.motion_gate else []
+    num_gated, live_tracks, track_boxes = 0, False, []
+
     # Get names and colors
     names = model.module.names if hasattr(model, 'module') else model.names
 
     # Run inference
+    # keep an input buffer for every size --dynamic-img-size switches between
+    max_shapes = 2
+    if resolution_scheduler is not None:
+        max_shapes = len(resolution_scheduler.sizes) + 1
+    input_stager = InputStager(device, half=half, max_shapes=max_shapes)
     if device.type != 'cpu':
         model(torch.zeros(1, 3, imgsz, imgsz).to(device).type_as(next(model.parameters())))  # run once
     t0 = time.time()
@@ -137,14 +170,59 @@ def detect(opt):
     save_path = str(Path(out))
     # extract what is in between the last '/' and last '.'
     txt_file_name = source.split('/')[-1].split('.')[0]
-    txt_path = str(Path(out)) + '/' + txt_file_name + '.txt'
-
-    for frame_idx, (path, img, im0s, vid_cap) in enumerate(dataset):
-        img = torch.from_numpy(img).to(device)
-        img = img.half() if half else img.float()  # uint8 to fp16/32
-        img /= 255.0  # 0 - 255 to 0.0 - 1.0
-        if img.ndimension() == 3:
-            img = img.unsqueeze(0)
+    txt_ext = '.' + opt.save_format.replace('mot', 'txt')
+    if num_streams == 1:
+        txt_paths = [str(Path(out)) + '/' + txt_file_name + txt_ext]
+    else:
+        txt_paths = [str(Path(out)) + '/' + txt_file_name + '_%d' % i + txt_ext
+                     for i in range(num_streams)]
+    if save_txt:
+        result_writers = [ResultWriter(txt_path, opt.save_format, delimiter=' ',
+                                       mode='w' if opt.save_format == 'npz' else 'a')
+                          for txt_path in txt_paths]
+
+    # The loop body is split into the stages of --pipeline; decoding and
+    # letterboxing happen in the dataset iterator.
+    @torch.no_grad()
+    def detect_stage(frame):
+        nonlocal num_gated
+        frame_idx, (path, img, im0s, vid_cap) = frame
+        if not detection_scheduler.is_keyframe():
+            return frame_idx, path, None, im0s, vid_cap, None, 0.
+
+        roi, region_boxes = None, None
+        if motion_gates:
+            # skip the detector if no stream changed and nothing is tracked
+            changed = [gate.update(im0) for gate, im0 in zip(motion_gates, im0s if webcam else [im0s])]
+            if not any(changed) and not live_tracks:
+                num_gated += 1
+                img_shape = img.shape if img.ndim == 4 else (1,) + img.shape
+                return frame_idx, path, img_shape, im0s, vid_cap, [None] * num_streams, 0.
+            if opt.motion_roi and not webcam and regions is None:
+                # detect on the changed region and around the tracks only
+                roi = motion_gates[0].changed_box(track_boxes=track_boxes)
+                if roi is not None:
+                    x1, y1, x2, y2 = roi
+                    img = letterbox(im0s[y1:y2, x1:x2], imgsz, stride=stride)[0]
+                    img = np.ascontiguousarray(img[:, :, ::-1].transpose(2, 0, 1))  # BGR to RGB, to 3xHxW
+
+        if resolution_scheduler is not None and roi is None and regions is None:
+            # letterbox again at the size the smallest track needs
+            size = resolution_scheduler.select()
+            if size != imgsz:
+                img = np.stack([letterbox(im0, size, auto=not webcam, stride=stride)[0]
+                                for im0 in (im0s if webcam else [im0s])])
+                img = np.ascontiguousarray(img[..., ::-1].transpose(0, 3, 1, 2))  # BGR to RGB, to Nx3xHxW
+
+        if regions is not None:
+            # detect on the ROI/tile crops of all streams as one batch
+            region_boxes, crops = zip(*[regions.split(im0) for im0 in (im0s if webcam else [im0s])])
+            img = np.stack([letterbox(crop, imgsz, auto=False, stride=stride)[0]
+                            for stream_crops in crops for crop in stream_crops])
+            img = np.ascontiguousarray(img[..., ::-1].transpose(0, 3, 1, 2))  # BGR to RGB, to Nx3xHxW
+
+        # uint8 to fp16/32 and 0 - 255 to 0.0 - 1.0, in reused buffers
+        img = input_stager(img)
 
         # Inference
         t1 = time_synchronized()
@@ -155,68 +233,103 @@ def detect(opt):
             pred, opt.conf_thres, opt.iou_thres, classes=opt.classes, agnostic=opt.agnostic_nms)
         t2 = time_synchronized()
 
-        # Process detections
-        for i, det in enumerate(pred):  # detections per image
-            if webcam:  # batch_size >= 1
-                p, s, im0 = path[i], '%g: ' % i, im0s[i].copy()
-            else:
-                p, s, im0 = path, '', im0s
-
-            s += '%gx%g ' % img.shape[2:]  # print string
+        # Rescale boxes from img_size to im0 size
+        if region_boxes is not None:
+            pred = iter(pred)
+            merged = []
+            for boxes in region_boxes:
+                dets = []
+                for x1, y1, x2, y2 in boxes:
+                    det = next(pred)
+                    det[:, :4] = scale_coords(img.shape[2:], det[:, :4], (y2 - y1, x2 - x1)).round()
+                    det[:, :4] += det.new_tensor([x1, y1, x1, y1])
+                    dets.append(det)
+                merged.append(regions.merge(dets, opt.iou_thres, agnostic=opt.agnostic_nms))
+            return frame_idx, path, img.shape, im0s, vid_cap, merged, t2 - t1
+
+        for i, det in enumerate(pred):
+            if det is not None and len(det):
+                if roi is not None:
+                    det[:, :4] = scale_coords(
+                        img.shape[2:], det[:, :4], (y2 - y1, x2 - x1)).round()
+                    det[:, :4] += det.new_tensor([x1, y1, x1, y1])
+                else:
+                    det[:, :4] = scale_coords(
+                        img.shape[2:], det[:, :4], (im0s[i] if webcam else im0s).shape).round()
+        return frame_idx, path, img.shape, im0s, vid_cap, pred, t2 - t1
+
+    def track_stream(i, det, path, img_shape, im0s):
+        if webcam:  # batch_size >= 1
+            p, s, im0 = path[i], '%g: ' % i, im0s[i].copy()
+        else:
+            p, s, im0 = path, '', im0s
+
+        if img_shape is None:
+            # the detector skipped this frame, predict the tracks only
+            s += 'propagated '
+            outputs = deepsorts[i].propagate(im0)
+            return p, s, im0, outputs
+
+        s += '%gx%g ' % img_shape[2:]  # print string
+        outputs = None
+
+        if det is not None and len(det):
+            # Print results
+            for c in det[:, -1].unique():
+                n = (det[:, -1] == c).sum()  # detections per class
+                s += '%g %ss, ' % (n, names[int(c)])  # add to string
+
+            # pass detections (x1, y1, x2, y2, conf, cls) to deepsort
+            outputs = deepsorts[i].update_batch(det[:, :6], im0)
+
+        else:
+            deepsorts[i].increment_ages()
+        return p, s, im0, outputs
+
+    def track_stage(frame):
+        nonlocal live_tracks, track_boxes
+        frame_idx, path, img_shape, im0s, vid_cap, pred, dt = frame
+
+        # Process detections per image; with the ReID service, the streams
+        # are tracked in parallel and their crops share ReID batches
+        n = num_streams
+        results = list((tracking_pool.map if tracking_pool else map)(
+            track_stream, range(n), pred or [None] * n, [path] * n, [img_shape] * n, [im0s] * n))
+        if pred is not None:
+            detection_scheduler.update([d.tracker for d in deepsorts])
+        if resolution_scheduler is not None:
+            resolution_scheduler.update([d.tracker for d in deepsorts],
+                                        [max(im0.shape[:2]) for im0 in (im0s if webcam else [im0s])])
+        live_tracks = any(t.time_since_update <= 1 for d in deepsorts for t in d.tracker.tracks)
+        if opt.motion_roi:
+            track_boxes = [t.to_tlbr() for t in deepsorts[0].tracker.tracks]
+        return frame_idx, vid_cap, results, dt
+
+    def output_stage(frame):
+        nonlocal save_path
+        frame_idx, vid_cap, results, dt = frame
+
+        for i, (p, s, im0, outputs) in enumerate(results):
             save_path = str(Path(out) / Path(p).name)
 
-            if det is not None and len(det):
-                # Rescale boxes from img_size to im0 size
-                det[:, :4] = scale_coords(
-                    img.shape[2:], det[:, :4], im0.shape).round()
-
-                # Print results
-                for c in det[:, -1].unique():
-                    n = (det[:, -1] == c).sum()  # detections per class
-                    s += '%g %ss, ' % (n, names[int(c)])  # add to string
-
-                xywh_bboxs = []
-                confs = []
-
-                # Adapt detections to deep sort input format
-                for *xyxy, conf, cls in det:
-                    # to deep sort format
-                    x_c, y_c, bbox_w, bbox_h = xyxy_to_xywh(*xyxy)
-                    xywh_obj = [x_c, y_c, bbox_w, bbox_h]
-                    xywh_bboxs.append(xywh_obj)
-                    confs.append([conf.item()])
-
-                xywhs = torch.Tensor(xywh_bboxs)
-                confss = torch.Tensor(confs)
-
-                # pass detections to deepsort
-                outputs = deepsort.update(xywhs, confss, im0)
-
-                # draw boxes for visualization
-                if len(outputs) > 0:
-                    bbox_xyxy = outputs[:, :4]
-                    identities = outputs[:, -1]
-                    draw_boxes(im0, bbox_xyxy, identities)
+            # draw boxes for visualization
+            if outputs is not None and len(outputs) > 0:
+                bbox_xyxy = np.stack([outputs['x1'], outputs['y1'],
+                                      outputs['x2'], outputs['y2']], axis=1)
+                identities = outputs['track_id']
+                draw_boxes(im0, bbox_xyxy, identities)
+
+                # Write MOT compliant results to file
+                if save_txt:
                     # to MOT format
-                    tlwh_bboxs = xyxy_to_tlwh(bbox_xyxy)
-
-                    # Write MOT compliant results to file
-                    if save_txt:
-                        for j, (tlwh_bbox, output) in enumerate(zip(tlwh_bboxs, outputs)):
-                            bbox_top = tlwh_bbox[0]
-                            bbox_left = tlwh_bbox[1]
-                            bbox_w = tlwh_bbox[2]
-                            bbox_h = tlwh_bbox[3]
-                            identity = output[-1]
-                            with open(txt_path, 'a') as f:
-                                f.write(('%g ' * 10 + '\n') % (frame_idx, identity, bbox_top,
-                                                            bbox_left, bbox_w, bbox_h, -1, -1, -1, -1))  # label format
-
-            else:
-                deepsort.increment_ages()
+                    tlwh_bboxs = np.stack([outputs['x1'], outputs['y1'],
+                                           outputs['x2'] - outputs['x1'],
+                                           outputs['y2'] - outputs['y1']], axis=1)
+                    result_writers[i].write(frame_idx, tlwh_bboxs, identities,
+                                            outputs['conf'], outputs['class'])
 
             # Print time (inference + NMS)
-            print('%sDone. (%.3fs)' % (s, t2 - t1))
+            print('%sDone. (%.3fs)' % (s, dt))
 
             # Stream results
             if show_vid:
@@ -226,10 +339,10 @@ def detect(opt):
 
             # Save results (image with detections)
             if save_vid:
-                if vid_path != save_path:  # new video
-                    vid_path = save_path
-                    if isinstance(vid_writer, cv2.VideoWriter):
-                        vid_writer.release()  # release previous video writer
+                if vid_path[i] != save_path:  # new video
+                    vid_path[i] = save_path
+                    if isinstance(vid_writer[i], cv2.VideoWriter):
+                        vid_writer[i].release()  # release previous video writer
                     if vid_cap:  # video
                         fps = vid_cap.get(cv2.CAP_PROP_FPS)
                         w = int(vid_cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -238,8 +351,51 @@ def detect(opt):
                         fps, w, h = 30, im0.shape[1], im0.shape[0]
                         save_path += '.mp4'
 
-                    vid_writer = cv2.VideoWriter(save_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
-                vid_writer.write(im0)
+                    vid_writer[i] = cv2.VideoWriter(save_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+                vid_writer[i].write(im0)
+
+    try:
+        if opt.pipeline:
+            # decode, detection, ReID + tracking and output overlap on
+            # consecutive frames; every stage keeps the frame order
+            pipeline = Pipeline(('decode', enumerate(dataset)),
+                                [('detect', detect_stage), ('track', track_stage),
+                                 ('output', output_stage)],
+                                queue_size=opt.queue_size)
+            pipeline.run()
+            print(pipeline.report())
+        else:
+            for frame in enumerate(dataset):
+                output_stage(track_stage(detect_stage(frame)))
+    finally:
+        if save_txt:
+            for result_writer in result_writers:
+                result_writer.close()
+        if reid_service is not None:
+            tracking_pool.shutdown()
+            reid_service.close()
+            print(reid_service.report())
+
+    if opt.detect_every > 1:
+        print('Detector ran on %d of %d frames' % (
+            detection_scheduler.num_detected,
+            detection_scheduler.num_detected + detection_scheduler.num_propagated))
+
+    if regions is not None:
+        print(regions.report((imgsz, imgsz)))
+
+    if resolution_scheduler is not None:
+        counts = resolution_scheduler.counts
+        num_frames = max(sum(counts.values()), 1)
+        print('Detector input sizes: %s, %.0f%% of the full-size pixels' % (
+            ', '.join('%d: %d frames' % (size, n) for size, n in sorted(counts.items())),
+            100. * sum(n * size ** 2 for size, n in counts.items()) / (num_frames * imgsz ** 2)))
+
+    if motion_gates:
+        num_checked = motion_gates[0].num_frames
+        print('Motion gate: detector skipped on %d of %d frames (%.1f%%), %.2f ms per frame' % (
+            num_gated, num_checked, 100. * num_gated / max(num_checked, 1),
+            1000. * sum(gate.elapsed for gate in motion_gates) / max(num_checked, 1)))
 
     if save_txt or save_vid:
         print('Results saved to %s' % os.getcwd() + os.sep + out)
@@ -264,11 +420,25 @@ if __name__ == '__main__':
     parser.add_argument('--show-vid', action='store_true', help='display tracking video results')
     parser.add_argument('--save-vid', action='store_true', help='save video tracking results')
     parser.add_argument('--save-txt', action='store_true', help='save MOT compliant results to *.txt')
+    parser.add_argument('--save-format', type=str, default='mot', choices=['mot', 'bin', 'npz'],
+                        help='--save-txt format: MOT text (*.txt), raw records (*.bin) or compressed columns (*.npz)')
     # class 0 is person, 1 is bycicle, 2 is car... 79 is oven
     parser.add_argument('--classes', nargs='+', type=int, help='filter by class: --class 0, or --class 16 17')
     parser.add_argument('--agnostic-nms', action='store_true', help='class-agnostic NMS')
     parser.add_argument('--augment', action='store_true', help='augmented inference')
     parser.add_argument('--evaluate', action='store_true', help='augmented inference')
+    parser.add_argument('--detect-every', type=int, default=1, help='run the detector on every n-th frame only')
+    parser.add_argument('--adaptive-stride', action='store_true', help='adapt --detect-every to track count and motion')
+    parser.add_argument('--dynamic-img-size', action='store_true', help='pick the inference size per frame from the smallest track')
+    parser.add_argument('--min-track-height', type=float, default=32, help='--dynamic-img-size: smallest track height in input pixels')
+    parser.add_argument('--probe-interval', type=int, default=30, help='--dynamic-img-size: run at --img-size at least every n frames')
+    parser.add_argument('--roi', action='append', help='detect inside this polygon only, x1,y1,x2,y2,x3,y3,...; repeatable')
+    parser.add_argument('--tiles', type=str, default='1x1', help='detect on a ROWSxCOLS tile grid, e.g. 2x2')
+    parser.add_argument('--tile-overlap', type=float, default=0.1, help='overlap of neighbouring tiles')
+    parser.add_argument('--motion-gate', action='store_true', help='skip the detector on unchanged frames without tracks')
+    parser.add_argument('--motion-roi', action='store_true', help='with --motion-gate, detect around the changed region and the tracks only')
+    parser.add_argument('--pipeline', action='store_true', help='run decode, detection, tracking and output in parallel stages')
+    parser.add_argument('--queue-size', type=int, default=2, help='frames waiting in front of each pipeline stage')
     parser.add_argument("--config_deepsort", type=str, default="deep_sort_pytorch/configs/deep_sort.yaml")
     args = parser.parse_args()
     args.img_size = check_img_size(args.img_size)